@@ -0,0 +1,43 @@
+"""
+Gunicorn設定（Cloud Run用）
+
+モデルとDocumentOCRPipelineをプロセス内で共有するため、ワーカーは既定で1プロセスのみとし、
+リクエストはgthreadワーカーのスレッドで並行処理する。
+共有パイプラインはスレッドセーフでないため、OCRの実行は src/api/main.py のロックでプロセス内1件ずつに直列化する。
+
+preload_app の制約:
+- アプリは親プロセスでimportされ、その時点でモデルのウォームアップスレッドが起動する。
+- スレッドが動いている最中にforkすると、ロックが保持されたまま子にコピーされてデッドロックし得るため、
+  pre_fork でワーカー数に関わらず必ずウォームアップスレッドの終了を待ってからforkする。
+- torch/YOLOが親で起動したスレッドプール（OpenMP等）はforkで子に引き継がれない。
+  子で推論が固まる場合は WEB_CONCURRENCY=1（既定）のまま WEB_THREADS で並行度を調整すること。
+"""
+import os
+
+bind = f":{os.environ.get('PORT', '8080')}"
+
+# 既定は1プロセス × Nスレッド（モデルのメモリを複数プロセスで重複させない）
+# CPU/メモリに余裕のあるインスタンスでは WEB_CONCURRENCY でワーカー数を増やせる（上記のfork制約に注意）
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", "8"))
+
+# メモリリーク対策として一定リクエスト毎にワーカーを再起動
+max_requests = 100
+max_requests_jitter = 10
+
+preload_app = True
+# 長時間のOCR処理を考慮したタイムアウト（秒）
+timeout = int(os.environ.get("WEB_TIMEOUT", "600"))
+worker_tmp_dir = "/dev/shm"
+
+
+def pre_fork(server, worker):
+    """親プロセスでウォームアップ完了を待ってからforkし、構築済みのモデルを子に引き継ぐ
+
+    1ワーカーでも待たないと、子がウォームアップ未完了と判断して2つ目のウォームアップを始め、
+    同じディレクトリへの二重ダウンロードとパイプラインの二重構築が起きる。
+    """
+    if preload_app:
+        from src.api.main import wait_for_warmup
+        wait_for_warmup()
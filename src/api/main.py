@@ -1,15 +1,51 @@
 import os
-import json
-import base64
+import asyncio
 import logging
 import shutil
-from flask import Flask, request, jsonify
-from datetime import datetime
+import time
+import threading
+import functools
+import itertools
+import concurrent.futures
+import collections
+import tempfile
+import gzip
+import re
+import random
+import hashlib
+import unicodedata
+import uuid
+import orjson
+try:
+    # 構造化出力のパースとスキーマ検証を1パスで行う（未インストール時はorjsonでパースのみ）
+    import msgspec
+except ImportError:
+    msgspec = None
+try:
+    # Celery（REDIS_URL 設定時のみ使用するオプション依存）
+    from celery import Celery
+except ImportError:
+    Celery = None
+try:
+    # SIMD実装のbase64デコーダ（未インストール環境では標準ライブラリにフォールバック）
+    import pybase64 as base64
+except ImportError:
+    import base64
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from datetime import datetime, timedelta, timezone
 import traceback
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Union
+from google.api_core import exceptions as google_exceptions
 from google.cloud import storage
-import subprocess
-import sys
+from google.cloud.storage import transfer_manager
+from requests.adapters import HTTPAdapter
+try:
+    import vertexai
+    from vertexai.generative_models import GenerativeModel, GenerationConfig, FunctionDeclaration, Tool
+except ImportError:
+    # Vertex AI SDK がない環境（ユニットテスト等）でもモジュールをimportできるようにする
+    vertexai = None
 from pathlib import Path
 import psycopg2
 from psycopg2.extras import RealDictCursor
@@ -19,15 +55,156 @@ os.environ.setdefault('PYTHONIOENCODING', 'utf-8')
 os.environ.setdefault('LANG', 'ja_JP.UTF-8')
 os.environ.setdefault('LC_ALL', 'ja_JP.UTF-8')
 from src.api.model_downloader import ensure_models_available
+from src.main_pipeline import DocumentOCRPipeline, run as pipeline_run
 
 app = Flask(__name__)
 
 # UTF-8エンコーディングを確実にする
 app.config['JSON_AS_ASCII'] = False
 
+# GCS転送のチャンクサイズ（256KiBの倍数。PDFの大半を1チャンクで転送できるサイズ）
+GCS_CHUNK_SIZE = 64 * 1024 * 1024
+
+# これより大きいオブジェクトはRange GETを並列発行してダウンロードする（スライスサイズを兼ねる）
+GCS_SLICED_DOWNLOAD_CHUNK_SIZE = 32 * 1024 * 1024
+GCS_SLICED_DOWNLOAD_WORKERS = 8
+
+# プロジェクトのルートディレクトリ（Cloud Runでは/app配下に配置、ローカル開発環境ではリポジトリのルート）
+PROJECT_ROOT = Path("/app") if Path("/app").exists() else Path(__file__).parent.parent.parent
+
+# リクエスト毎の結果出力ディレクトリを作成する親ディレクトリ
+RESULT_ROOT = Path(os.environ.get('OCR_RESULT_ROOT', '/tmp/result'))
+
+# GCSアップロードのタイムアウト（接続, 読み取り）秒
+GCS_UPLOAD_TIMEOUT = (5, 60)
+
+# これより大きいJSONはgzip（レベル1）で圧縮してアップロードする（Content-Encoding: gzip、既定の0で無効）
+# 取得側はGCSの展開トランスコーディングまたはクライアントライブラリの自動展開で元のJSONを受け取るため、
+# 下流の読み取り側がすべてgzipに対応していることを確認してから有効化する
+GCS_JSON_GZIP_MIN_BYTES = int(os.environ.get('GCS_JSON_GZIP_MIN_BYTES', '0'))
+
+# 結果ファイルのGCSアップロード用スレッドプール（I/O待ちを重ねるため）
+# GCSへのPUTはソケット待ちが支配的なため、GILに関係なく~16並列まではほぼ線形に短縮できる
+GCS_UPLOAD_WORKERS = int(os.environ.get('GCS_UPLOAD_WORKERS', '16'))
+_UPLOAD_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=GCS_UPLOAD_WORKERS, thread_name_prefix="gcs-upload")
+
+# PubSubを即時ACKしてバックグラウンドでOCRを実行するか
+# Cloud Runのリクエストベース課金ではレスポンス後にCPUが絞られるため、
+# 「CPUを常に割り当てる」設定のサービスでのみ有効化すること
+PUBSUB_ASYNC_ACK = os.environ.get('PUBSUB_ASYNC_ACK', 'false').lower() == 'true'
+# 共有のDocumentOCRPipeline（YOLOのpredict等）はスレッドセーフでないため既定は1
+OCR_CONCURRENCY = int(os.environ.get('OCR_CONCURRENCY', '1'))
+_JOB_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=OCR_CONCURRENCY, thread_name_prefix="ocr-job")
+
+# REDIS_URL が設定されていればOCRをCeleryワーカーに委譲し、PubSubには即時ACKする
+# ワーカー起動: celery -A src.api.main.celery_app worker --concurrency=N -Q ocr
+REDIS_URL = os.environ.get('REDIS_URL')
+celery_app = Celery("ocr", broker=REDIS_URL, backend=REDIS_URL) if Celery is not None and REDIS_URL else None
+if celery_app is not None:
+    celery_app.conf.task_default_queue = "ocr"
+    celery_app.conf.worker_prefetch_multiplier = 1
+
+# 受付済みPubSubオブジェクトID（重複配信の再処理を防ぐLRU+TTL）
+# 値は (有効期限[monotonic秒], 処理完了時のレスポンス or None=処理中)
+_seen_objects = collections.OrderedDict()
+_seen_objects_lock = threading.Lock()
+_SEEN_OBJECTS_MAX = int(os.environ.get('PUBSUB_DEDUP_MAX', '4096'))
+_SEEN_OBJECTS_TTL = float(os.environ.get('PUBSUB_DEDUP_TTL', '900'))
+
+
+def mark_object_seen(object_id: str) -> bool:
+    """
+    オブジェクトIDを受付済みとして記録する
+
+    Returns:
+        bool: 初回（またはTTL切れ）ならTrue、既に受付済み（重複配信）ならFalse
+    """
+    now = time.monotonic()
+    with _seen_objects_lock:
+        entry = _seen_objects.get(object_id)
+        if entry is not None and entry[0] > now:
+            _seen_objects.move_to_end(object_id)
+            return False
+        _seen_objects[object_id] = (now + _SEEN_OBJECTS_TTL, None)
+        _seen_objects.move_to_end(object_id)
+        while len(_seen_objects) > _SEEN_OBJECTS_MAX:
+            _seen_objects.popitem(last=False)
+        return True
+
+
+def remember_object_result(object_id: str, response: Dict[str, Any]) -> None:
+    """処理完了時のレスポンスを記録し、TTL内の再配信ではこれを返す"""
+    with _seen_objects_lock:
+        if object_id in _seen_objects:
+            _seen_objects[object_id] = (time.monotonic() + _SEEN_OBJECTS_TTL, response)
+
+
+def forget_object(object_id: str) -> None:
+    """受付記録を削除し、再配信で再処理できるようにする"""
+    with _seen_objects_lock:
+        _seen_objects.pop(object_id, None)
+
+
+def get_object_result(object_id: str) -> Optional[Dict[str, Any]]:
+    """記録済みのレスポンスを取得（処理中・未記録・TTL切れはNone）"""
+    with _seen_objects_lock:
+        entry = _seen_objects.get(object_id)
+    if entry is None or entry[0] <= time.monotonic():
+        return None
+    return entry[1]
+
+
+def get_object_status(object_id: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    オブジェクトの処理状況を取得
+
+    Returns:
+        (状態, 処理完了時のレスポンス)。状態は "processing" / "completed" / "failed" / "unknown"（未受付・TTL切れ）
+    """
+    with _seen_objects_lock:
+        entry = _seen_objects.get(object_id)
+    if entry is None or entry[0] <= time.monotonic():
+        return "unknown", None
+    response = entry[1]
+    if response is None:
+        return "processing", None
+    if "task_id" in response and "success" not in response and celery_app is not None:
+        return _celery_task_status(response)
+    return ("completed" if response.get("success") else "failed"), response
+
+
+def _celery_task_status(response: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Celeryへ委譲したジョブの状態を判定（ワーカーは別プロセスのためタスクの状態を参照する）"""
+    task = celery_app.AsyncResult(response["task_id"])
+    if task.state == "SUCCESS":
+        return "completed", {**response, **task.result}
+    if task.state == "FAILURE":
+        return "failed", {**response, "success": False, "error": str(task.result)}
+    return "processing", response
+
+# orjsonのシリアライズオプション（page_count_distribution等の非文字列キーに対応）
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """FlaskのJSON処理をorjsonに差し替えるプロバイダー（jsonify等の全呼び出し元に適用）"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS).decode('utf-8')
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
+app.json = OrjsonProvider(app)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+if REDIS_URL and celery_app is None:
+    logger.warning("⚠️ REDIS_URL is set but celery is not installed (pip install 'celery[redis]') - falling back to in-process OCR")
+
 # Cloud Run起動時にモデルをダウンロード
 def initialize_models():
     """起動時にモデルをダウンロード（512MB構成用に軽量化）"""
@@ -50,8 +227,498 @@ def initialize_models():
         logger.error(f"❌ Failed to initialize models: {e}")
         logger.warning("⚠️ Continuing without models - OCR features may be limited")
 
-# アプリケーション起動時にモデルを初期化
-initialize_models()
+# ================================
+# Pipeline Warmup
+# ================================
+
+# パイプラインはプロセス内で1つだけ構築して使い回す（リクエスト毎のモデル再ロードを避ける）
+_pipeline = None
+_pipeline_lock = threading.Lock()
+# 共有パイプラインはスレッドセーフでないため実行を直列化する
+# （gthreadの全スレッドが同時にOCRしてメモリを使い切ることも防ぐ）
+_pipeline_run_lock = threading.Lock()
+# ウォームアップ完了フラグ（/healthはこれが立つまで503を返し、Cloud Runのトラフィックを止める）
+ready_event = threading.Event()
+_warmup_pid = None
+_warmup_thread = None
+
+
+def get_pipeline():
+    """DocumentOCRPipelineのシングルトンを取得（初回のみ構築）"""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                config_path = PROJECT_ROOT / "config.yml"
+                logger.info(f"🔧 Building DocumentOCRPipeline: {config_path}")
+                _pipeline = DocumentOCRPipeline(str(config_path))
+    return _pipeline
+
+
+def _warmup():
+    """モデルのダウンロードとパイプライン構築をバックグラウンドで実行"""
+    try:
+        initialize_models()
+        get_pipeline()
+        logger.info("✅ Pipeline warmup completed")
+    except Exception as e:
+        logger.error(f"❌ Pipeline warmup failed: {e}")
+        logger.warning("⚠️ Pipeline will be built on first request")
+    finally:
+        ready_event.set()
+
+
+def start_warmup():
+    """プロセス毎に1回だけウォームアップスレッドを起動"""
+    global _warmup_pid, _warmup_thread
+    if _warmup_pid == os.getpid():
+        return
+    _warmup_pid = os.getpid()
+    _warmup_thread = threading.Thread(target=_warmup, name="pipeline-warmup", daemon=True)
+    _warmup_thread.start()
+
+
+def wait_for_warmup():
+    """ウォームアップ完了を待ち、ウォームアップスレッドの終了まで確認する（gunicornのpre_forkから呼ぶ）"""
+    ready_event.wait()
+    # ready_eventはfinally節で立つため、スレッド自体の終了も待ってからforkさせる
+    if _warmup_thread is not None and _warmup_pid == os.getpid():
+        _warmup_thread.join()
+
+
+def _reset_warmup_after_fork():
+    """gunicorn --preload でfork された子プロセスの状態を再初期化"""
+    global _pipeline_lock, _pipeline_run_lock, ready_event
+    # 親のロックはスレッド保持中にコピーされている可能性があるため作り直す
+    _pipeline_lock = threading.Lock()
+    _pipeline_run_lock = threading.Lock()
+    if ready_event.is_set() and _pipeline is not None:
+        # 親でウォームアップ済みならCopy-on-Writeで共有されたパイプラインをそのまま使う
+        ready_event = threading.Event()
+        ready_event.set()
+        return
+    ready_event = threading.Event()
+    start_warmup()
+
+
+os.register_at_fork(after_in_child=_reset_warmup_after_fork)
+
+# ================================
+# GCS Client
+# ================================
+
+# storage.Client()は認証情報の探索とHTTPセッション生成を伴うため、プロセス内で1つを使い回す
+_storage_client = None
+_storage_client_lock = threading.Lock()
+
+# 並列アップロード・分割ダウンロードがTCP/TLSセッションを使い回せるようにコネクションプールを広げる
+GCS_HTTP_POOL_CONNECTIONS = 32
+GCS_HTTP_POOL_MAXSIZE = 64
+
+
+def get_storage_client() -> storage.Client:
+    """GCSクライアントの遅延初期化"""
+    global _storage_client
+    if _storage_client is None:
+        with _storage_client_lock:
+            if _storage_client is None:
+                client = storage.Client()
+                # requestsの既定（10接続）ではスレッドプールの同時実行数に足りず、都度TLSハンドシェイクが発生する
+                client._http.mount("https://", HTTPAdapter(
+                    pool_connections=GCS_HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=GCS_HTTP_POOL_MAXSIZE,
+                ))
+                _storage_client = client
+    return _storage_client
+
+
+@functools.lru_cache(maxsize=8)
+def get_bucket(bucket_name: str) -> storage.Bucket:
+    """バケットオブジェクトをキャッシュして取得"""
+    return get_storage_client().bucket(bucket_name)
+
+
+def _reset_storage_client_after_fork():
+    """fork後の子プロセスで親のHTTPセッション（ソケット）を共有しないようにする"""
+    global _storage_client, _storage_client_lock
+    _storage_client = None
+    _storage_client_lock = threading.Lock()
+    get_bucket.cache_clear()
+
+
+os.register_at_fork(after_in_child=_reset_storage_client_after_fork)
+
+
+def parse_gcs_uri(uri: str) -> Tuple[str, str]:
+    """
+    gs://bucket/path/to/object を (バケット名, オブジェクトパス) に分解する
+
+    Raises:
+        ValueError: gs:// で始まらない場合
+    """
+    if not uri.startswith('gs://'):
+        raise ValueError(f"Invalid GCS URI: {uri}")
+    bucket_name, _, object_name = uri[5:].partition('/')
+    return bucket_name, object_name
+
+# ================================
+# Vertex AI
+# ================================
+
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'
+# 短い契約書の構造化に使う軽量モデル（例: gemini-2.5-flash-lite）
+# 条文を原文どおり抜き出す精度を評価してから有効化するため、既定は空文字（無効）
+GEMINI_LITE_MODEL_NAME = os.environ.get('GEMINI_LITE_MODEL_NAME', '')
+# 軽量モデルを使うOCRテキストの最大文字数（これを超える長い契約書は精度を優先してGEMINI_MODEL_NAMEを使う）
+GEMINI_LITE_MAX_CHARS = int(os.environ.get('GEMINI_LITE_MAX_CHARS', '60000'))
+
+# vertexai.init()はグローバル設定の再構築と認証を伴うため、プロセス内で1回だけ実行する
+_vertexai_initialized = False
+_vertexai_lock = threading.Lock()
+
+
+def init_vertexai() -> bool:
+    """Vertex AIを初期化（初回のみ）。GCP_PROJECT_IDが未設定の場合はFalse"""
+    global _vertexai_initialized
+    if _vertexai_initialized:
+        return True
+    if vertexai is None:
+        logger.error("vertexai (google-cloud-aiplatform) がインストールされていません")
+        return False
+    project_id_env = os.getenv('GCP_PROJECT_ID')
+    location = os.getenv('GCP_LOCATION', 'us-central1')
+    if not project_id_env:
+        logger.error("GCP_PROJECT_ID環境変数が設定されていません")
+        return False
+    with _vertexai_lock:
+        if not _vertexai_initialized:
+            vertexai.init(project=project_id_env, location=location)
+            _vertexai_initialized = True
+    return True
+
+
+
+# 契約書の構造化出力スキーマ（Geminiのresponse_schema）
+CONTRACT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "success": {"type": "boolean"},
+        "info": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string"},
+                "party": {"type": "string"},  # カンマ区切りの当事者名
+                "start_date": {"type": "string"},  # 空文字列で対応
+                "end_date": {"type": "string"},  # 空文字列で対応
+                "conclusion_date": {"type": "string"}  # 空文字列で対応
+            },
+            "required": ["title", "party"]
+        },
+        "result": {
+            "type": "object",
+            "properties": {
+                "articles": {
+                    "type": "array",
+                    "items": {
+                        "anyOf": [
+                            {
+                                "type": "object",
+                                "properties": {
+                                    "article_number": {"type": "string"},
+                                    "title": {"type": "string"},
+                                    "content": {"type": "string"},
+                                    "table_number": {"type": "string"}
+                                },
+                                "required": ["content", "title"]
+                            },
+                            {
+                                "type": "object",
+                                "properties": {
+                                    "title": {"type": "string"},
+                                    "party": {"type": "string"},
+                                    "start_date": {"type": "string"},
+                                    "end_date": {"type": "string"},
+                                    "conclusion_date": {"type": "string"}
+                                },
+                                "required": ["title", "party"]
+                            }
+                        ]
+                    }
+                }
+            },
+            "required": ["articles"]
+        }
+    },
+    "required": ["success", "info", "result"]
+}
+
+
+if msgspec is not None:
+    # CONTRACT_SCHEMA に対応する型（未設定のオプション項目はNoneとし、出力時に省く）
+    class ContractArticle(msgspec.Struct, omit_defaults=True):
+        """条文、または2つ目以降の契約書基本情報"""
+        title: str
+        article_number: Optional[str] = None
+        content: Optional[str] = None
+        table_number: Optional[str] = None
+        party: Optional[str] = None
+        start_date: Optional[str] = None
+        end_date: Optional[str] = None
+        conclusion_date: Optional[str] = None
+
+    class ContractInfo(msgspec.Struct, omit_defaults=True):
+        """1つ目の契約書の基本情報"""
+        title: str
+        party: str
+        start_date: Optional[str] = None
+        end_date: Optional[str] = None
+        conclusion_date: Optional[str] = None
+
+    class ContractResult(msgspec.Struct):
+        articles: List[ContractArticle]
+
+    class ContractResponse(msgspec.Struct):
+        success: bool
+        info: ContractInfo
+        result: ContractResult
+
+    _CONTRACT_DECODE_ERRORS = (msgspec.DecodeError,)
+else:
+    _CONTRACT_DECODE_ERRORS = (orjson.JSONDecodeError,)
+
+
+def decode_contract_response(text: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Geminiの構造化出力をパースする（msgspecがあればスキーマ検証も同時に行う）
+
+    Returns:
+        (契約書データ, 条文数)
+    """
+    if msgspec is not None:
+        contract = msgspec.json.decode(text, type=ContractResponse)
+        return msgspec.to_builtins(contract), len(contract.result.articles)
+    structured_data = orjson.loads(text)
+    return structured_data, len(structured_data.get('result', {}).get('articles', []))
+
+
+@functools.lru_cache(maxsize=1)
+def get_contract_generation_config() -> "GenerationConfig":
+    """契約書構造化用のGenerationConfigを取得（初回のみ構築）"""
+    return GenerationConfig(
+        response_mime_type="application/json",
+        response_schema=CONTRACT_SCHEMA,
+        # 条文数の多い契約書でもJSONが途中で切れないよう出力上限を最大にする
+        max_output_tokens=65535
+    )
+
+
+# 契約書構造化プロンプトの前置き（固定部分）
+CONTRACT_PROMPT_HEADER = "以下のOCR処理済みテキストを解析し、契約書の構造化データとして抽出してください。"
+
+# 契約書構造化プロンプトの抽出指示（固定部分）
+CONTRACT_PROMPT_INSTRUCTIONS = """抽出指示:
+1. success: 常にtrue
+2. info部分（1つ目の契約書の情報のみ）:
+   - title: 契約書のタイトル（見つからない場合はファイル名を使用）
+   - party: 契約当事者をカンマ区切りで記載（例: "株式会社A,株式会社B"）
+   - start_date: 契約開始日（YYYY-MM-DD形式、見つからない場合は空文字列）
+   - end_date: 契約終了日（YYYY-MM-DD形式、見つからない場合は空文字列）
+   - conclusion_date: 契約締結日（YYYY-MM-DD形式、見つからない場合は空文字列）
+
+3. result部分:
+   - articles: 契約条項の配列（全ての条項を漏れなく抽出）
+     - article_number: 条項番号（例: "第1条"、"第2条"、番号がない場合は"署名欄"等）
+     - title: 条項のタイトル（見出しがない場合は内容から要約）
+     - content: 条項の完全な内容（省略禁止）
+     - table_number: 表がある場合のみ表番号
+
+重要な注意事項:
+- テキスト内の全ての条項を必ず抽出してください（第1条から最後まで）
+- 各条項のcontentは完全にコピーし、省略や要約は行わないでください
+- 条項番号が明記されていない部分（前文、署名欄、付記等）も独立した条項として扱ってください
+- 日付は可能な限りYYYY-MM-DD形式に変換してください
+- 表や図がある場合はHTML形式でcontentに含めてください
+- 署名欄も必ず1つの条項として扱ってください
+- 出力は必ず完全なJSON形式で、途中で切れることなく最後まで出力してください
+
+【複数契約書がある場合の特別ルール】:
+1. 契約書内部ドキュメントと契約書の区切りを正確に判別:
+   - 「頭書」「要項」「契約書本文」「用紙」「条件表」「概要」「特約」「細則」「別紙」「仕様書」「別添」「図面」「約款」「派遣個別契約票契約基本情報」「定義一覧表」などは契約書の内部ドキュメントであり、区切りではありません
+   - これらは1つの契約書を構成する要素として、同じarticles配列内に含めてください
+   - ドキュメントごとのタイトル、契約当事者、契約条項、署名などの重要な情報が分割後も完全に保持されるように調査してください
+   - 分割により情報の欠如や漏れが発生しないよう、慎重に分析してください
+
+2. 契約書の終了を示す箇所（「以上」等）は、以下の形式で統一:
+   {
+     "article_number": "",
+     "title": "契約書終了",
+     "content": "----------",
+     "table_number": ""
+   }
+
+3. 2つ目以降の契約書が始まる場合、契約書終了の直後に契約書基本情報をそのまま挿入:
+   {
+     "title": "[契約書タイトル]",
+     "party": "[当事者をカンマ区切り]",
+     "start_date": "[YYYY-MM-DD または空文字列]",
+     "end_date": "[YYYY-MM-DD または空文字列]",
+     "conclusion_date": "[YYYY-MM-DD または空文字列]"
+   }
+
+4. その後、2つ目の契約書の条項を続けて記載
+"""
+
+# 固定部分を連結済みのプロンプト先頭（呼び出し毎には可変部分を後ろに繋ぐだけにする）
+CONTRACT_PROMPT_PREFIX = f"""
+{CONTRACT_PROMPT_HEADER}
+
+{CONTRACT_PROMPT_INSTRUCTIONS}
+"""
+
+# 固定プロンプトをVertex AIのコンテキストキャッシュに載せるか（入力トークンの課金とprefillを削減）
+GEMINI_CONTEXT_CACHE = os.environ.get('GEMINI_CONTEXT_CACHE', 'false').lower() == 'true'
+GEMINI_CONTEXT_CACHE_TTL = timedelta(minutes=int(os.environ.get('GEMINI_CONTEXT_CACHE_TTL_MINUTES', '60')))
+# TTL切れ直前のキャッシュを使わないよう、この時間を残して作り直す
+_CONTEXT_CACHE_REFRESH_MARGIN = 300
+
+_contract_cache = None
+_contract_cache_expires_at = 0.0
+_contract_cache_lock = threading.Lock()
+# 固定プロンプトが最小キャッシュサイズに満たない等、作り直しても成功しない場合はプロセス内で無効化する
+_contract_cache_disabled = False
+
+
+def get_contract_cached_content():
+    """
+    固定プロンプトのCachedContentを取得（期限が近ければ作り直す）
+
+    Returns:
+        CachedContent: 無効化されている、または作成に失敗した場合はNone
+    """
+    global _contract_cache, _contract_cache_expires_at, _contract_cache_disabled
+    if not GEMINI_CONTEXT_CACHE or _contract_cache_disabled:
+        return None
+    with _contract_cache_lock:
+        if _contract_cache_disabled:
+            return None
+        # 作成失敗後も期限までは作り直さず、Noneを返して通常のプロンプトで処理する
+        if time.monotonic() < _contract_cache_expires_at:
+            return _contract_cache
+        try:
+            from vertexai.preview import caching
+            _contract_cache = caching.CachedContent.create(
+                model_name=GEMINI_MODEL_NAME,
+                system_instruction=f"{CONTRACT_PROMPT_HEADER}\n\n{CONTRACT_PROMPT_INSTRUCTIONS}",
+                ttl=GEMINI_CONTEXT_CACHE_TTL,
+            )
+            _contract_cache_expires_at = (
+                time.monotonic() + GEMINI_CONTEXT_CACHE_TTL.total_seconds() - _CONTEXT_CACHE_REFRESH_MARGIN
+            )
+            logger.info(f"🗄️ Created Vertex AI context cache: {_contract_cache.name}")
+        except google_exceptions.InvalidArgument as e:
+            # 最小トークン数に満たない等、内容が原因の失敗は再試行しても変わらないため以降は作成しない
+            logger.warning(f"⚠️ Vertex AI context cache rejected, disabling it for this process: {e}")
+            _contract_cache = None
+            _contract_cache_disabled = True
+        except Exception as e:
+            # 一時的な障害で作成できない場合は通常のプロンプトで処理し、しばらくしてから作り直す
+            logger.warning(f"⚠️ Failed to create Vertex AI context cache, sending full prompt: {e}")
+            _contract_cache = None
+            _contract_cache_expires_at = time.monotonic() + _CONTEXT_CACHE_REFRESH_MARGIN
+        return _contract_cache
+
+
+def build_contract_request(basename: str, file_content: str):
+    """
+    契約書構造化用のモデルとプロンプトを組み立てる
+
+    短い契約書は軽量モデル（GEMINI_LITE_MODEL_NAME）を使う。
+    コンテキストキャッシュが有効なら固定部分はキャッシュ側に持たせ、プロンプトは可変部分のみとする。
+    OCRテキストは連結せず独立したパートとして渡し、長いテキストのコピーをメモリ上に作らない
+    """
+    # 短い契約書は軽量モデルで十分なため、コンテキストキャッシュ（通常モデル用）は使わず軽量モデルへ送る
+    use_lite_model = bool(GEMINI_LITE_MODEL_NAME) and len(file_content) <= GEMINI_LITE_MAX_CHARS
+
+    cached_content = None if use_lite_model else get_contract_cached_content()
+    if cached_content is not None:
+        from vertexai.preview.generative_models import GenerativeModel as PreviewGenerativeModel
+        model = PreviewGenerativeModel.from_cached_content(cached_content=cached_content)
+        prompt = [f"ファイル名: {basename}\n\nテキスト内容:\n", file_content]
+        return model, prompt
+
+    model = get_gemini_model(GEMINI_LITE_MODEL_NAME if use_lite_model else GEMINI_MODEL_NAME)
+    # 固定部分を先頭、ファイル名とOCRテキストを末尾に置き、Geminiの暗黙的キャッシュ（前方一致）を効かせる
+    prompt = [f"{CONTRACT_PROMPT_PREFIX}ファイル名: {basename}\n\nテキスト内容:\n", file_content]
+    return model, prompt
+
+
+# GenerativeModelは非同期gRPCクライアントを保持し、最初に使ったイベントループに束縛される。
+# そのためイベントループとモデルはスレッド毎に1つ作って使い回す（gthread/ジョブプールのスレッドは常駐する）
+_vertexai_thread_local = threading.local()
+
+
+def get_thread_event_loop() -> asyncio.AbstractEventLoop:
+    """呼び出しスレッド専用のイベントループを取得（初回のみ作成）"""
+    loop = getattr(_vertexai_thread_local, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        _vertexai_thread_local.loop = loop
+    return loop
+
+
+def get_gemini_model(model_name: str = GEMINI_MODEL_NAME) -> "GenerativeModel":
+    """呼び出しスレッド用のGeminiモデルハンドルを取得（モデル名毎にリクエスト間で使い回す）"""
+    models = getattr(_vertexai_thread_local, 'models', None)
+    if models is None:
+        models = _vertexai_thread_local.models = {}
+    model = models.get(model_name)
+    if model is None:
+        model = models[model_name] = GenerativeModel(model_name)
+    return model
+
+
+# Gemini呼び出しの一時的な失敗（レート制限・過負荷・タイムアウト）に対するリトライ設定
+GEMINI_RETRY_ATTEMPTS = int(os.environ.get('GEMINI_RETRY_ATTEMPTS', '3'))
+GEMINI_RETRY_BASE_SECONDS = 1.0
+GEMINI_RETRY_MAX_SECONDS = 16.0
+_GEMINI_RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+async def generate_content_with_retry(model: "GenerativeModel", prompt: Union[str, List[str]], generation_config: "GenerationConfig"):
+    """
+    generate_content_asyncを指数バックオフ（ジッター付き）でリトライする
+
+    一時的なエラーのみリトライし、最後の試行で失敗した場合はそのまま例外を送出する
+    """
+    for attempt in range(GEMINI_RETRY_ATTEMPTS):
+        try:
+            return await model.generate_content_async(prompt, generation_config=generation_config)
+        except _GEMINI_RETRYABLE_ERRORS as e:
+            if attempt + 1 >= GEMINI_RETRY_ATTEMPTS:
+                raise
+            delay = min(GEMINI_RETRY_MAX_SECONDS, GEMINI_RETRY_BASE_SECONDS * 2 ** attempt) + random.uniform(0, 0.25)
+            logger.warning(f"🔁 Gemini call failed ({type(e).__name__}), retrying in {delay:.1f}s ({attempt + 1}/{GEMINI_RETRY_ATTEMPTS})")
+            await asyncio.sleep(delay)
+
+
+def _reset_vertexai_after_fork():
+    """fork後の子プロセスでロックとスレッド毎のモデルを作り直す"""
+    global _vertexai_lock, _contract_cache_lock, _structured_contract_lock, _vertexai_thread_local
+    _vertexai_lock = threading.Lock()
+    _contract_cache_lock = threading.Lock()
+    _structured_contract_lock = threading.Lock()
+    # 親プロセスのgRPCチャネルやイベントループは引き継がない
+    _vertexai_thread_local = threading.local()
+
+
+os.register_at_fork(after_in_child=_reset_vertexai_after_fork)
 
 # ================================
 # Database Connection
@@ -233,45 +900,33 @@ def save_page_count_to_db(project_id: str, total_page_count: int, bucket_name: s
         if conn:
             conn.close()
 
-def get_project_root():
-    """プロジェクトのルートディレクトリを取得"""
-    # Cloud Runでは/app配下にプロジェクトが配置される
-    if Path("/app").exists():
-        return Path("/app")
-    else:
-        # ローカル開発環境
-        return Path(__file__).parent.parent.parent
-
-def run_main_pipeline(pdf_path: str) -> Dict[str, Any]:
+def run_main_pipeline(pdf_path: str, result_dir: Optional[str] = None) -> Dict[str, Any]:
     """
-    main_pipeline.pyを実行してOCR処理を行う
+    ウォームアップ済みのパイプラインでOCR処理をインプロセス実行する
 
     Args:
         pdf_path: 処理対象のPDFファイルパス
+        result_dir: 最終結果の出力先（省略時は設定の result_base_dir）
 
     Returns:
         Dict: 処理結果（パイプライン結果を含む）
     """
     try:
-        # main_pipeline.pyをPythonモジュールとして直接実行
-        from src.main_pipeline import DocumentOCRPipeline
-        import asyncio
-
-        project_root = get_project_root()
-        config_path = project_root / "config.yml"
-
         logger.info(f"🚀 Running main pipeline for: {pdf_path}")
 
-        # パイプラインインスタンスを作成
-        pipeline = DocumentOCRPipeline(str(config_path))
+        # ウォームアップ済みのパイプラインインスタンスを取得
+        pipeline = get_pipeline()
 
-        # 非同期処理を実行
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # セッションIDはStep7の成果物名（gemini_integrated_<session_id>.txt 等）に使われるため従来の
+        # 「ベース名_日時」を残し、同名PDFの並行リクエストと中間ディレクトリが衝突しないよう短いUUIDを付ける
+        base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        session_id = f"{base_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
         try:
-            pipeline_result = loop.run_until_complete(pipeline.process_pdf(pdf_path))
+            with _pipeline_run_lock:
+                pipeline_result = pipeline_run(pdf_path, pipeline=pipeline, session_id=session_id,
+                                               result_dir=result_dir)
         finally:
-            loop.close()
+            pipeline.directory_manager.remove_session_directories(session_id)
 
         if pipeline_result.get("success"):
             logger.info("✅ main_pipeline executed successfully")
@@ -290,7 +945,9 @@ def run_main_pipeline(pdf_path: str) -> Dict[str, Any]:
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()}), 200
+    if not ready_event.is_set():
+        return jsonify({'status': 'warming_up', 'timestamp': datetime.now(timezone.utc).isoformat()}), 503
+    return jsonify({'status': 'healthy', 'timestamp': datetime.now(timezone.utc).isoformat()}), 200
 
 @app.route('/debug-blobs', methods=['GET'])
 def debug_blobs():
@@ -298,28 +955,51 @@ def debug_blobs():
     try:
         
         prefix = request.args.get('prefix', '')
+        limit = int(request.args.get('limit', 1000))
+        # delimiter='/' を指定するとフォルダ単位で1階層だけ一覧する
+        delimiter = request.args.get('delimiter') or None
+        # 前回のレスポンスの next_page_token を渡すと続きから一覧する
+        page_token = request.args.get('page_token') or None
         bucket_name = 'app_contracts_staging'
         
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
+        bucket = get_bucket(bucket_name)
         
-        blobs = list(bucket.list_blobs(prefix=prefix))
+        # 必要なフィールドだけを取得し、件数も上限を設けてGCSの往復とレスポンスサイズを抑える
+        blobs = bucket.list_blobs(
+            prefix=prefix,
+            delimiter=delimiter,
+            max_results=limit,
+            page_size=min(limit, 1000),
+            page_token=page_token,
+            fields="items(name,size,timeCreated,contentType),prefixes,nextPageToken",
+        )
         
-        blob_info = []
-        for blob in blobs:
-            blob_info.append({
-                'name': blob.name,
-                'size': blob.size,
-                'created': blob.time_created.isoformat() if blob.time_created else None,
-                'content_type': blob.content_type
-            })
+        # 1ページ目は先に取得し、GCSエラーは500として返せるようにする
+        pages = blobs.pages
+        first_page = next(pages, None)
         
-        return jsonify({
-            'bucket': bucket_name,
-            'prefix': prefix,
-            'total_blobs': len(blob_info),
-            'blobs': blob_info
-        }), 200
+        def generate():
+            """一覧をページ単位でJSONとして逐次出力（全件をメモリに保持しない）"""
+            yield b'{"bucket":' + orjson.dumps(bucket_name) + b',"prefix":' + orjson.dumps(prefix) + b',"blobs":['
+            total = 0
+            first_pages = [first_page] if first_page is not None else []
+            for page in itertools.chain(first_pages, pages):
+                for blob in page:
+                    yield (b',' if total else b'') + orjson.dumps({
+                        'name': blob.name,
+                        'size': blob.size,
+                        'created': blob.time_created.isoformat() if blob.time_created else None,
+                        'content_type': blob.content_type
+                    })
+                    total += 1
+            # 上限に達して打ち切った場合は続きのトークンを返す（最後まで一覧した場合はnull）
+            tail = b'],"total_blobs":' + orjson.dumps(total) + b',"next_page_token":' + orjson.dumps(blobs.next_page_token)
+            if delimiter:
+                # prefixes はイテレータを消費した後に確定する
+                tail += b',"prefixes":' + orjson.dumps(sorted(blobs.prefixes))
+            yield tail + b'}'
+        
+        return Response(stream_with_context(generate()), status=200, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Debug blobs error: {str(e)}")
@@ -339,14 +1019,15 @@ def root():
             '/health': 'Health check',
             '/ocr [GET]': 'Test OCR with local PDF files',
             '/ocr [POST]': 'OCR with GCS PDF URL',
-            '/pubsub/push [POST]': 'PubSub webhook for automatic processing'
+            '/pubsub/push [POST]': 'PubSub webhook for automatic processing',
+            '/jobs/<object_id> [GET]': 'Status of a PubSub-accepted object'
         },
         'usage': {
             'GET /ocr': 'Process PDF from /pdf/ directory',
             'GET /ocr?file=test.pdf': 'Process specific PDF file',
             'POST /ocr': 'Send {"pdf_url": "gs://bucket/file.pdf", "workspace_id": "ws", "project_id": "proj"}'
         },
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': datetime.now(timezone.utc).isoformat()
     }), 200
 
 @app.route('/ocr', methods=['GET'])
@@ -356,17 +1037,21 @@ def ocr_test():
     
     クエリパラメータ:
         file: PDFファイル名 (オプション、デフォルトは自動検出)
+        include_content: true / 1（大文字小文字を区別しない）の場合、結果JSONファイルの内容もレスポンスに含める
         
     例: /ocr?file=test.pdf
     """
+    t0 = time.monotonic()
     try:
         logger.info("🚀 GET /ocr endpoint called")
         
         # クエリパラメータからファイル名を取得
         pdf_filename = request.args.get('file')
+        include_content = request.args.get('include_content', '').lower() in ('true', '1')
         
         # テスト用のOCR処理を実行
-        result = process_test_pdf(pdf_filename)
+        result = process_test_pdf(pdf_filename, include_content=include_content)
+        logger.info("✅ GET /ocr finished in %.1fs", time.monotonic() - t0)
         
         response = {
             "status": "completed",
@@ -398,6 +1083,7 @@ def ocr_upload():
             "project_id": "project456"
         }
     """
+    t0 = time.monotonic()
     try:
         logger.info("🚀 POST /ocr endpoint called")
         
@@ -420,10 +1106,10 @@ def ocr_upload():
         
         # GCS URIの場合
         if pdf_url.startswith('gs://'):
-            bucket_name = pdf_url.replace('gs://', '').split('/')[0]
-            object_name = '/'.join(pdf_url.replace('gs://', '').split('/')[1:])
+            bucket_name, object_name = parse_gcs_uri(pdf_url)
             
             result = process_single_pdf(bucket_name, object_name, workspace_id, project_id)
+            logger.info("✅ POST /ocr finished in %.1fs", time.monotonic() - t0)
         else:
             return jsonify({
                 "status": "error",
@@ -456,34 +1142,26 @@ def pubsub_push():
     Cloud PubSub Push通知を受け取るエンドポイント
     GCS Storage Object notificationを処理
     """
+    # 詳細なデバッグログはDEBUGレベル時のみ組み立てる（本番INFOでは整形コストを払わない）
+    DEBUG = logger.isEnabledFor(logging.DEBUG)
+    # 受信時刻は1回だけ取得し、テスト用ID生成とレスポンスで使い回す
+    received_at = datetime.now()
+    timestamp = received_at.isoformat()
+    # 処理時間の計測は単調時計で行う
+    t0 = time.monotonic()
     try:
-        logger.info("="*80)
-        logger.info("🔵 PUBSUB PUSH REQUEST RECEIVED")
-        logger.info("="*80)
-
-        logger.info(f"📌 Request Method: {request.method}")
-        logger.info(f"📌 Request URL: {request.url}")
-        logger.info(f"📌 Request Path: {request.path}")
-
-        logger.info("📋 REQUEST HEADERS:")
-        for key, value in request.headers:
-            logger.info(f"  - {key}: {value}")
+        # リクエストボディは1回だけ読み出し、以降はこのbytesを使い回す
+        raw_body = request.get_data(cache=False)
+        if DEBUG:
+            logger.debug("📌 Request: %s %s", request.method, request.url)
+            logger.debug("📋 Request headers: %s", dict(request.headers))
+            logger.debug("📝 Content-Type: %s", request.content_type)
+            logger.debug("📦 Raw Request Data (head): %r", raw_body[:256])
 
-        logger.info(f"📝 Content-Type: {request.content_type}")
-        logger.info(f"📝 Content-Length: {request.content_length}")
-
-        logger.info(f"📦 Raw Request Data: {request.data}")
-        logger.info(f"📦 Request Data Type: {type(request.data)}")
-        logger.info(f"📦 Request Data Length: {len(request.data) if request.data else 0}")
-
-        logger.info("🔍 Attempting to parse JSON...")
         envelope = None
         try:
-            envelope = request.get_json()
-            logger.info(f"✅ JSON parsed successfully")
-            logger.info(f"📊 Envelope type: {type(envelope)}")
-            logger.info(f"📊 Envelope keys: {list(envelope.keys()) if envelope else 'None'}")
-            logger.info(f"📊 Full envelope content: {json.dumps(envelope, indent=2) if envelope else 'None'}")
+            envelope = orjson.loads(raw_body)
+            logger.debug("📊 Full envelope content: %s", envelope)
         except Exception as json_error:
             logger.error(f"❌ JSON parsing failed: {str(json_error)}")
             logger.error(f"❌ Error type: {type(json_error).__name__}")
@@ -494,7 +1172,6 @@ def pubsub_push():
 
         # Check delivery attempt and skip if too many retries
         delivery_attempt = envelope.get('deliveryAttempt', 0)
-        logger.info(f"📬 Delivery attempt: {delivery_attempt}")
 
         if delivery_attempt > 2:
             logger.warning(f"⚠️ Skipping message after {delivery_attempt} delivery attempts")
@@ -505,10 +1182,7 @@ def pubsub_push():
             return jsonify({"error": "Bad Request: invalid PubSub message format"}), 400
             
         pubsub_message = envelope["message"]
-        logger.info("📨 PUBSUB MESSAGE:")
-        logger.info(f"  - Message type: {type(pubsub_message)}")
-        logger.info(f"  - Message keys: {list(pubsub_message.keys()) if isinstance(pubsub_message, dict) else 'Not a dict'}")
-        logger.info(f"  - Full message: {json.dumps(pubsub_message, indent=2)}")
+        logger.debug("📨 Full PubSub message: %s", pubsub_message)
 
         # attributesからbucketId, workspaceId, selectedRiskIdsを取得
         attributes = pubsub_message.get("attributes", {})
@@ -516,38 +1190,29 @@ def pubsub_push():
         workspace_id_from_attr = attributes.get("workspaceId")
         selected_risk_ids_str = attributes.get("selectedRiskIds")
 
-        logger.info(f"📦 Bucket ID from attributes: {bucket_id}")
-        logger.info(f"📦 Workspace ID from attributes: {workspace_id_from_attr}")
-        logger.info(f"📦 Selected Risk IDs from attributes: {selected_risk_ids_str}")
-
         # selectedRiskIdsをパース（カンマ区切りの文字列を整数配列に変換）
         selected_risk_ids = None
         if selected_risk_ids_str:
             try:
                 selected_risk_ids = [int(id.strip()) for id in selected_risk_ids_str.split(",") if id.strip()]
-                logger.info(f"📊 Parsed selected risk IDs: {selected_risk_ids}")
+                logger.debug("📊 Parsed selected risk IDs: %s", selected_risk_ids)
             except Exception as e:
                 logger.warning(f"⚠️ Failed to parse selectedRiskIds: {e}")
 
         if isinstance(pubsub_message.get("data"), str):
             try:
-                logger.info("🔓 Attempting Base64 decode...")
-                logger.info(f"  - Data length (encoded): {len(pubsub_message['data'])}")
-                logger.info(f"  - First 100 chars: {pubsub_message['data'][:100]}...")
-                
-                message_data = base64.b64decode(pubsub_message["data"]).decode("utf-8")
-                logger.info(f"✅ Base64 decode successful")
-                logger.info(f"  - Decoded length: {len(message_data)}")
-                logger.info(f"  - First 200 chars: {message_data[:200] if message_data else 'Empty'}...")
+                # orjsonはbytesを直接受け付けるため、UTF-8文字列へのデコードは行わない
+                raw = base64.b64decode(pubsub_message["data"], validate=False)
+                if DEBUG:
+                    logger.debug("🔓 Base64 decoded: %d -> %d bytes, head: %r",
+                                 len(pubsub_message["data"]), len(raw), raw[:200])
                 
-                if not message_data or not message_data.strip():
-                    logger.warning(f"⚠️ Decoded message is empty or whitespace only")
+                if not raw or raw.isspace():
+                    logger.warning("⚠️ Decoded message is empty or whitespace only")
                     return jsonify({"status": "ignored", "reason": "Empty message"}), 200
                 
-                storage_object = json.loads(message_data)
-                logger.info(f"✅ JSON parse of decoded data successful")
-                logger.info(f"📄 Storage Object keys: {list(storage_object.keys())}")
-                logger.info(f"📄 Full Storage Object: {json.dumps(storage_object, indent=2)}")
+                storage_object = orjson.loads(raw)
+                logger.debug("📄 Full Storage Object: %s", storage_object)
             except Exception as e:
                 logger.error(f"❌ Failed to decode PubSub message: {str(e)}")
                 logger.error(f"❌ Error type: {type(e).__name__}")
@@ -564,45 +1229,26 @@ def pubsub_push():
         # Test用でidが無い場合は自動生成
         if "id" not in storage_object:
             logger.warning("⚠️ Storage Object has no 'id' field, generating one for testing...")
-            storage_object["id"] = f"test-{storage_object.get('name', 'unknown')}-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            storage_object["id"] = f"test-{storage_object.get('name', 'unknown')}-{received_at.strftime('%Y%m%d_%H%M%S')}"
             
         object_id = storage_object.get("id", "")
         object_name = storage_object.get("name", "")
         object_bucket = storage_object.get("bucket", "")
         
-        logger.info("🗂️ STORAGE OBJECT INFO:")
-        logger.info(f"  - Object ID: {object_id}")
-        logger.info(f"  - Object Name: {object_name}")
-        logger.info(f"  - Bucket: {object_bucket}")
-        logger.info(f"  - Content Type: {storage_object.get('contentType', 'N/A')}")
-        logger.info(f"  - Size: {storage_object.get('size', 'N/A')} bytes")
+        # workspace_id/project_id/filename に分解（先頭2要素だけが必要なのでpartitionで十分）
+        workspace_id, _, rest = object_name.partition("/")
+        project_id, sep, filename = rest.partition("/")
         
-        name_parts = object_name.split("/")
-        logger.info(f"📂 Name parts: {name_parts}")
-        logger.info(f"📂 Number of parts: {len(name_parts)}")
-        
-        if len(name_parts) < 3:
+        if not sep:
             logger.error(f"❌ Invalid object name format: {object_name} - expected at least 3 parts")
             return jsonify({"error": "Invalid object name format"}), 400
-            
-        workspace_id = name_parts[0]
-        project_id = name_parts[1]
-        filename = "/".join(name_parts[2:])
-
-        logger.info("✨ EXTRACTED INFO:")
-        logger.info(f"  - Workspace ID: {workspace_id}")
-        logger.info(f"  - Project ID: {project_id}")
-        logger.info(f"  - Filename: {filename}")
 
         if not filename.lower().endswith('.pdf'):
-            logger.info(f"⚠️ Ignoring non-PDF file: {filename}")
+            logger.info("⚠️ Ignoring non-PDF file: %s", filename)
             return jsonify({"message": "File ignored (not a PDF)"}), 200
 
-        logger.info(f"🚀 Starting PDF processing - workspace: {workspace_id}, project: {project_id}, file: {filename}")
-
         # bucketIdがない場合はobject_bucketをフォールバック
         target_bucket = bucket_id if bucket_id else object_bucket
-        logger.info(f"🪣 Using bucket: {target_bucket}")
 
         # workspace_idを整数に変換（attributesから取得した値、なければパスから）
         workspace_id_int = None
@@ -618,26 +1264,82 @@ def pubsub_push():
             except Exception as e:
                 logger.warning(f"⚠️ Failed to parse workspaceId from path: {e}")
 
-        logger.info(f"📊 Final workspace_id (int): {workspace_id_int}")
-        logger.info(f"📊 Final selected_risk_ids: {selected_risk_ids}")
-
-        result = process_single_pdf(target_bucket, object_name, workspace_id, project_id, workspace_id_int, selected_risk_ids)
-        
-        response = {
+        # リクエスト情報は1件の構造化ログにまとめて出力（Cloud Loggingはjson_fieldsを解釈する）
+        request_info = {
+            "object_id": object_id,
+            "object_name": object_name,
+            "bucket": target_bucket,
             "workspace_id": workspace_id,
+            "workspace_id_int": workspace_id_int,
             "project_id": project_id,
-            "file": filename,
-            "success": result["success"],
-            "timestamp": datetime.now().isoformat()
+            "filename": filename,
+            "size": storage_object.get("size"),
+            "content_type": storage_object.get("contentType"),
+            "delivery_attempt": delivery_attempt,
+            "selected_risk_ids": selected_risk_ids,
+            "body_length": len(raw_body),
         }
+        logger.info("🚀 pubsub_push accepted: %s", request_info, extra={"json_fields": request_info})
+
+        # PubSubは at-least-once 配信のため、同一オブジェクト（idは世代番号を含む）の再配信は再OCRしない
+        if not mark_object_seen(object_id):
+            cached_response = get_object_result(object_id)
+            if cached_response is not None:
+                logger.info("⏭️ Duplicate delivery answered from cache: %s", object_id)
+                return jsonify(cached_response), 200
+            logger.info("⏭️ Duplicate delivery ignored: %s", object_id)
+            return jsonify({"status": "duplicate", "object_id": object_id}), 200
+
+        if celery_app is not None:
+            # OCRはCeleryワーカーに任せ、PubSubには即時ACKする
+            try:
+                task = process_pdf_task.delay(
+                    target_bucket, object_name, workspace_id, project_id, workspace_id_int, selected_risk_ids
+                )
+            except Exception as e:
+                # 投入できなかった場合は受付記録を消し、NACKしてPubSubの再配信で再試行させる
+                logger.error(f"❌ Failed to enqueue Celery task for {filename}: {e}")
+                forget_object(object_id)
+                return jsonify({"error": "Failed to enqueue task", "object_id": object_id}), 503
+            response = {
+                "status": "queued",
+                "task_id": task.id,
+                "object_id": object_id,
+                "workspace_id": workspace_id,
+                "project_id": project_id,
+                "file": filename,
+                "timestamp": timestamp
+            }
+            # 以降の再配信にはこのレスポンスを返し、/jobs はtask_idからCeleryの状態を参照する
+            remember_object_result(object_id, response)
+            return jsonify(response), 200
+
+        if PUBSUB_ASYNC_ACK:
+            # 即時ACKしてOCRはバックグラウンドで実行（ACK期限超過による再配信を防ぐ）
+            future = _JOB_POOL.submit(
+                process_single_pdf, target_bucket, object_name, workspace_id, project_id, workspace_id_int, selected_risk_ids
+            )
+            future.add_done_callback(
+                lambda f: _log_job_result(f, filename, object_id, workspace_id, project_id, timestamp)
+            )
+            return jsonify({
+                "status": "accepted",
+                "object_id": object_id,
+                "workspace_id": workspace_id,
+                "project_id": project_id,
+                "file": filename,
+                "timestamp": timestamp
+            }), 200
+
+        result = process_single_pdf(target_bucket, object_name, workspace_id, project_id, workspace_id_int, selected_risk_ids)
+        response = build_pubsub_response(result, workspace_id, project_id, filename, timestamp)
+        # 失敗時も200で応答し再配信は来ないため、/jobs が処理中のまま残らないよう成否を問わず記録する
+        remember_object_result(object_id, response)
         
         if result["success"]:
-            response["contract_json"] = result.get("contract_json", "")
-            response["output_files"] = result.get("output_files", [])
-            logger.info(f"Successfully processed PDF: {filename}")
+            logger.info("Successfully processed PDF: %s (%.1fs)", filename, time.monotonic() - t0)
         else:
-            response["error"] = result.get("error", "Processing failed")
-            logger.error(f"Failed to process PDF: {filename} - {result.get('error')}")
+            logger.error("Failed to process PDF: %s (%.1fs) - %s", filename, time.monotonic() - t0, result.get('error'))
             
         return jsonify(response), 200
         
@@ -649,21 +1351,68 @@ def pubsub_push():
             "message": str(e)
         }), 200
 
-def process_test_pdf(pdf_filename: Optional[str] = None) -> Dict[str, Any]:
+@app.route('/jobs/<path:object_id>', methods=['GET'])
+def job_status(object_id: str):
+    """
+    PubSubで受け付けたオブジェクトの処理状況を返す（即時ACK時のポーリング用）
+
+    object_id はStorage Objectのid（bucket/name/generation）。状態はこのインスタンス内の記録のみで判定する
+    """
+    status, response = get_object_status(object_id)
+    body = {"object_id": object_id, "status": status}
+    if response is not None:
+        body["result"] = response
+    return jsonify(body), 200 if status != "unknown" else 404
+
+
+def build_pubsub_response(result: Dict[str, Any], workspace_id: str, project_id: str, filename: str, timestamp: str) -> Dict[str, Any]:
+    """process_single_pdfの結果からPubSubハンドラのレスポンスを組み立てる"""
+    response = {
+        "workspace_id": workspace_id,
+        "project_id": project_id,
+        "file": filename,
+        "success": result["success"],
+        "timestamp": timestamp
+    }
+    if result["success"]:
+        response["contract_json"] = result.get("contract_json", "")
+        response["output_files"] = result.get("output_files", [])
+        response["truncated"] = result.get("truncated", False)
+    else:
+        response["error"] = result.get("error", "Processing failed")
+    return response
+
+
+def _log_job_result(future: concurrent.futures.Future, filename: str, object_id: str, workspace_id: str, project_id: str, timestamp: str) -> None:
+    """バックグラウンドOCRジョブの完了ログを出力し、/jobs で参照できるように結果を記録"""
+    try:
+        result = future.result()
+    except Exception as e:
+        logger.error(f"Background job crashed for {filename}: {e}")
+        result = {"success": False, "error": str(e)}
+    else:
+        if result.get("success"):
+            logger.info(f"Successfully processed PDF: {filename}")
+        else:
+            logger.error(f"Failed to process PDF: {filename} - {result.get('error')}")
+    # 即時ACK済みで再配信は来ないため、失敗時も結果を記録する
+    remember_object_result(object_id, build_pubsub_response(result, workspace_id, project_id, filename, timestamp))
+
+def process_test_pdf(pdf_filename: Optional[str] = None, include_content: bool = False) -> Dict[str, Any]:
     """
     テスト用のPDF処理（ローカルのpdf/ディレクトリから）
     
     Args:
         pdf_filename: 処理するPDFファイル名（オプション）
+        include_content: 結果JSONファイルの内容をresult_filesに含めるか
         
     Returns:
         処理結果を含む辞書
     """
+    result_dir = None
     try:
-        project_root = get_project_root()
-        
         # ローカルのpdf/ディレクトリからPDFを検索
-        local_pdf_dir = project_root / "pdf"
+        local_pdf_dir = PROJECT_ROOT / "pdf"
         
         if not local_pdf_dir.exists():
             return {
@@ -692,8 +1441,12 @@ def process_test_pdf(pdf_filename: Optional[str] = None) -> Dict[str, Any]:
         
         logger.info(f"Processing local PDF: {pdf_path}")
         
+        # 結果はリクエスト専用のディレクトリに出力させ、以前の実行や同時実行中のリクエストの結果と混ざらないようにする
+        RESULT_ROOT.mkdir(parents=True, exist_ok=True)
+        result_dir = Path(tempfile.mkdtemp(prefix="test_", dir=RESULT_ROOT))
+        
         # main_pipeline.pyを実行
-        pipeline_result = run_main_pipeline(str(pdf_path))
+        pipeline_result = run_main_pipeline(str(pdf_path), result_dir=str(result_dir))
         
         if not pipeline_result["success"]:
             logger.error(f"Pipeline execution failed: {pipeline_result.get('error')}")
@@ -703,16 +1456,10 @@ def process_test_pdf(pdf_filename: Optional[str] = None) -> Dict[str, Any]:
                 'pipeline_output': pipeline_result
             }
         
-        # 結果ファイルを収集
-        basename = os.path.splitext(pdf_filename)[0]
+        # 結果ファイルを収集（result_dirはこのリクエスト専用のため、中のファイルはすべて現在のPDFの結果）
         result_files = []
         contract_data = None
         
-        # resultディレクトリをスキャン
-        result_dir = project_root / "result"
-        if not result_dir.exists():
-            result_dir = Path("/tmp/result")
-        
         if result_dir.exists():
             for result_file in result_dir.glob("*"):
                 if result_file.is_file():
@@ -722,16 +1469,17 @@ def process_test_pdf(pdf_filename: Optional[str] = None) -> Dict[str, Any]:
                         "path": str(result_file)
                     }
                     
-                    # JSONファイルの場合は内容も読み取り
-                    if result_file.suffix == '.json':
+                    # JSONファイルは契約データか、内容の要求がある場合のみ読み取る
+                    is_contract_metadata = 'integration_metadata' in result_file.name
+                    if result_file.suffix == '.json' and (include_content or is_contract_metadata):
                         try:
-                            with open(result_file, 'r', encoding='utf-8') as f:
-                                json_content = json.load(f)
-                            file_info["content"] = json_content
+                            json_content = orjson.loads(result_file.read_bytes())
                             
-                            # integration_metadataの場合は契約データとして扱う
-                            if 'integration_metadata' in result_file.name:
+                            # integration_metadataの場合は契約データとして扱う（contentには重複させない）
+                            if is_contract_metadata:
                                 contract_data = json_content
+                            else:
+                                file_info["content"] = json_content
                         except Exception as e:
                             logger.warning(f"Failed to read JSON file {result_file.name}: {e}")
                     
@@ -753,6 +1501,10 @@ def process_test_pdf(pdf_filename: Optional[str] = None) -> Dict[str, Any]:
             'success': False,
             'error': str(e)
         }
+    finally:
+        # 結果はレスポンスに含めて返すため、リクエスト専用の結果ディレクトリは削除する
+        if result_dir is not None:
+            shutil.rmtree(result_dir, ignore_errors=True)
 
 def process_single_pdf(bucket_name: str, object_name: str, workspace_id: str, project_id: str, workspace_id_int: Optional[int] = None, selected_risk_ids: Optional[List[int]] = None) -> Dict[str, Any]:
     """
@@ -769,56 +1521,29 @@ def process_single_pdf(bucket_name: str, object_name: str, workspace_id: str, pr
     Returns:
         処理結果を含む辞書
     """
+    result_dir = None
+    upload_futures = []  # 並列アップロード中のFuture（result_dir削除前にすべて完了を待つ）
+    structured_json_future = None
     try:
         gcs_uri = f"gs://{bucket_name}/{object_name}"
         logger.info(f"Processing PDF from: {gcs_uri}")
         
-        # Cloud Run対応：書き込み可能ディレクトリを使用
-        pdf_dir = Path("/tmp/pdf")
-        pdf_dir.mkdir(exist_ok=True)
-        
-        # GCSからPDFを一時ディレクトリにダウンロード
-        filename = os.path.basename(object_name)
-        local_file_path = pdf_dir / filename
-        download_from_gcs(gcs_uri, str(local_file_path))
-
-        # 処理開始前にresultディレクトリをクリーンアップ
-        project_root = get_project_root()
-        result_dir = project_root / "result"
-        if not result_dir.exists():
-            result_dir = Path("/tmp/result")
-
-        # 詳細ログ追加でデバッグ
-        logger.info(f"🔍 project_root: {project_root}")
-        logger.info(f"🔍 result_dir: {result_dir}")
-        logger.info(f"🔍 result_dir.exists(): {result_dir.exists()}")
+        filename = object_name.rpartition("/")[2]
 
-        # 重要: Cloud Runでは毎回新しいインスタンスが起動されるはずだが、
-        # Dockerイメージに古いresultファイルが含まれている可能性があるため、
-        # 処理開始前に必ずresultディレクトリをクリーンアップ
-        if result_dir.exists():
-            logger.info(f"🧹 Cleaning up result directory before processing: {result_dir}")
-            for old_file in result_dir.glob("*"):
-                if old_file.is_file():
-                    try:
-                        old_file.unlink()
-                        logger.info(f"🗑️ Deleted old file: {old_file.name}")
-                    except Exception as e:
-                        logger.warning(f"Failed to delete old file {old_file.name}: {e}")
+        # 結果はリクエスト専用のディレクトリに出力させ、同時実行中の他リクエストと混ざらないようにする
+        RESULT_ROOT.mkdir(parents=True, exist_ok=True)
+        result_dir = Path(tempfile.mkdtemp(prefix=f"{workspace_id}_{project_id}_", dir=RESULT_ROOT))
+        logger.info(f"🔍 result_dir: {result_dir}")
 
-        logger.info(f"Starting OCR pipeline for: {local_file_path}")
+        # GCSからPDFをリクエスト毎の一時ディレクトリにダウンロード（処理後に自動削除される）
+        with tempfile.TemporaryDirectory(prefix=f"ocr_{workspace_id}_{project_id}_") as workspace_dir:
+            local_file_path = Path(workspace_dir) / filename
+            download_from_gcs(gcs_uri, str(local_file_path))
 
-        # main_pipeline.pyを実行
-        pipeline_result = run_main_pipeline(str(local_file_path))
+            logger.info(f"Starting OCR pipeline for: {local_file_path}")
 
-        # パイプライン実行後の詳細ログ
-        logger.info(f"🔍 After pipeline execution:")
-        logger.info(f"🔍 result_dir.exists(): {result_dir.exists()}")
-        if result_dir.exists():
-            all_files = list(result_dir.glob("*"))
-            logger.info(f"🔍 Files in result_dir: {[f.name for f in all_files]}")
-        else:
-            logger.warning(f"⚠️ result_dir does not exist: {result_dir}")
+            # main_pipeline.pyを実行
+            pipeline_result = run_main_pipeline(str(local_file_path), result_dir=str(result_dir))
 
         # 分割後のページ数を計算してDBに保存
         try:
@@ -832,26 +1557,6 @@ def process_single_pdf(bucket_name: str, object_name: str, workspace_id: str, pr
             logger.error(f"❌ Failed to save page count: {e}")
             # ページ数保存失敗してもOCR処理は続行
 
-        # 追加の候補パスもチェック
-        alternative_paths = [
-            Path("/app/result"),
-            project_root / "src" / "result",
-            Path.cwd() / "result",
-            Path("/tmp/result"),
-            Path("/app/src/result")
-        ]
-
-        for alt_path in alternative_paths:
-            logger.info(f"🔍 Checking alternative path: {alt_path}")
-            logger.info(f"🔍 Path exists: {alt_path.exists()}")
-            if alt_path.exists():
-                files = list(alt_path.glob("*"))
-                logger.info(f"🔍 Files in {alt_path}: {[f.name for f in files]}")
-                if files:
-                    logger.info(f"📁 Found {len(files)} files in {alt_path} - using this as result directory")
-                    result_dir = alt_path  # 実際にファイルがある場所を使用
-                    break
-
         if not pipeline_result["success"]:
             logger.error(f"Pipeline execution failed: {pipeline_result.get('error')}")
             return {
@@ -859,103 +1564,93 @@ def process_single_pdf(bucket_name: str, object_name: str, workspace_id: str, pr
                 'error': pipeline_result.get('error', 'Pipeline execution failed')
             }
 
-        # 処理後にPDFファイルを削除
-        if local_file_path.exists():
-            local_file_path.unlink()
-            logger.info(f"Cleaned up local PDF file: {local_file_path}")
-
         # 出力先バケットは入力と同じバケットを使用
         output_bucket = bucket_name
 
         # 結果ファイルをGCSにアップロード - パイプライン実行後にファイルを処理
-        basename = os.path.splitext(filename)[0]
+        basename = filename.rpartition(".")[0] or filename
         output_files = []
         
-        txt_files_to_delete = []  # 削除予定のtxtファイルを追跡
+        txt_files = []  # 構造化に使うtxtファイル（result_dirごと削除されるため個別の削除は不要）
 
         if result_dir.exists():
-            # 最新のファイルを検索（タイムスタンプ付きファイル）
-            # 重要: 現在のセッションのファイルのみを処理する
-            all_files = list(result_dir.glob("*"))
+            # result_dirはこのリクエスト専用のため、中のファイルはすべて現在のPDFの結果
+            # ディレクトリは1回のscandirで走査し、ファイル判定もd_typeで済ませる
+            with os.scandir(result_dir) as entries:
+                all_files = [Path(entry.path) for entry in entries if entry.is_file()]
             logger.info(f"📂 Found {len(all_files)} files in result directory for basename '{basename}'")
             for result_file in all_files:
-                if result_file.is_file():
-                    logger.info(f"🔍 Processing file: {result_file.name}")
-                    # ファイル名の基本チェックのみ実行
-                    # 古いファイル判定は削除し、現在のPDFに関連するファイルのみ処理
-
-                    # ファイル名に現在のPDFのbasenameが含まれているかチェック
-                    if basename not in result_file.name:
-                        logger.info(f"⏭️ Skipping file from different PDF: {result_file.name}")
-                        continue
-                    # 契約書メタデータJSONは保存しない
-                    if result_file.suffix == '.json' and 'integration_metadata' in result_file.name:
-                        logger.info(f"🚫 Skipping contract metadata JSON: {result_file.name}")
-                        continue
-
-                    # txtファイルは構造化処理で使用し、その後削除
-                    if result_file.suffix == '.txt':
-                        logger.info(f"📝 Found txt file for local processing: {result_file.name}")
-                        txt_files_to_delete.append(result_file)
-                        # GCSにはアップロードせず、ローカルで処理
-                        continue
-
-                    # その他のファイルをocr_resultsに保存
-                    output_prefix = f"{workspace_id}/{project_id}/ocr_results/"
-                    gcs_path = upload_file_to_gcs(
-                        str(result_file),
-                        output_bucket,
-                        output_prefix + result_file.name
-                    )
-                    output_files.append(gcs_path)
-                    logger.info(f"✅ Result file uploaded to: {gcs_path}")
+                logger.debug("🔍 Processing file: %s", result_file.name)
+                # 契約書メタデータJSONは保存しない
+                if result_file.suffix == '.json' and 'integration_metadata' in result_file.name:
+                    logger.debug("🚫 Skipping contract metadata JSON: %s", result_file.name)
+                    continue
 
-        # ローカルのtxtファイルを使用してGeminiで構造化
-        structured_json_path = None
-        logger.info(f"🔍 Looking for local txt files to structure. Found {len(txt_files_to_delete)} txt files")
-        for txt_file in txt_files_to_delete:
-            # 統合されたファイル（integratedを含む）を特定
-            if 'integrated' in txt_file.name:
-                logger.info(f"🎯 Found integrated file for structuring: {txt_file.name}")
-                try:
-                    logger.info(f"🧠 Starting Gemini structured output for local file: {txt_file.name}")
-                    # ローカルファイルから直接テキストを読み込み
-                    with open(txt_file, 'r', encoding='utf-8') as f:
-                        file_content = f.read()
-
-                    # Geminiの構造化出力を使用（ローカルファイル版）
-                    structured_result = convert_local_text_to_contract_schema(file_content, basename, workspace_id, project_id, output_bucket, workspace_id_int, selected_risk_ids)
-                    if structured_result:
-                        # 構造化されたJSONをafter_ocrに保存
-                        json_output_path = f"{workspace_id}/{project_id}/after_ocr/{basename}.json"
-                        structured_json_path = upload_json_to_gcs(
-                            structured_result,
-                            output_bucket,
-                            json_output_path
-                        )
-                        logger.info(f"✅ Structured contract JSON saved to: {structured_json_path}")
-                        break
-                    else:
-                        logger.warning(f"⚠️ Gemini structured output returned None for: {txt_file.name}")
-                except Exception as e:
-                    logger.error(f"❌ Failed to structure contract data for {txt_file.name}: {str(e)}")
-                    logger.error(f"❌ Stack trace: {traceback.format_exc()}")
+                # txtファイルは構造化処理で使用
+                if result_file.suffix == '.txt':
+                    logger.debug("📝 Found txt file for local processing: %s", result_file.name)
+                    txt_files.append(result_file)
+                    # GCSにはアップロードせず、ローカルで処理
                     continue
 
-        # 構造化処理が完了したら、ローカルのtxtファイルを削除
-        for txt_file in txt_files_to_delete:
+                # その他のファイルをocr_resultsに保存（スレッドプールで並列アップロード）
+                output_prefix = f"{workspace_id}/{project_id}/ocr_results/"
+                upload_futures.append(_UPLOAD_POOL.submit(
+                    upload_file_to_gcs,
+                    str(result_file),
+                    output_bucket,
+                    output_prefix + result_file.name
+                ))
+
+        # ローカルのtxtファイルを使用してGeminiで構造化（結果ファイルのアップロードと並行して実行）
+        structured_json_path = None
+        truncated = False  # 構造化に送るOCRテキストを上限で切り詰めたか（条文の欠落を呼び出し元に伝える）
+        # 統合されたファイル（integratedを含む）のみを構造化の候補とする
+        integrated_txt_files = (f for f in txt_files if 'integrated' in f.name)
+        for txt_file in integrated_txt_files:
             try:
-                txt_file.unlink()
-                logger.info(f"🗑️ Deleted local txt file: {txt_file.name}")
+                logger.info(f"🧠 Starting Gemini structured output for local file: {txt_file.name}")
+                # ローカルファイルから直接テキストを読み込み（1回のreadでbytesを取得し、まとめてデコード）
+                file_content = txt_file.read_bytes().decode('utf-8')
+
+                # Geminiの構造化出力を使用（ローカルファイル版）
+                structured_result = convert_local_text_to_contract_schema(file_content, basename, workspace_id, project_id, output_bucket, workspace_id_int, selected_risk_ids)
+                if structured_result:
+                    truncated = bool(structured_result.get("truncated"))
+                    # 構造化されたJSONをafter_ocrに保存
+                    json_output_path = f"{workspace_id}/{project_id}/after_ocr/{basename}.json"
+                    structured_json_future = _UPLOAD_POOL.submit(
+                        upload_json_to_gcs,
+                        structured_result,
+                        output_bucket,
+                        json_output_path
+                    )
+                    break
+                else:
+                    logger.warning(f"⚠️ Gemini structured output returned None for: {txt_file.name}")
             except Exception as e:
-                logger.warning(f"⚠️ Failed to delete txt file {txt_file.name}: {e}")
+                logger.error(f"❌ Failed to structure contract data for {txt_file.name}: {str(e)}")
+                logger.error(f"❌ Stack trace: {traceback.format_exc()}")
+                continue
 
-        # GCS上にtxtファイルはアップロードしていないため、削除処理は不要
-        
+        # 並列アップロードの完了を待機（構造化JSONの保存失敗は従来どおりログのみでOCR結果は返す）
+        for future in upload_futures:
+            gcs_path = future.result()
+            output_files.append(gcs_path)
+            logger.info(f"✅ Result file uploaded to: {gcs_path}")
+        if structured_json_future is not None:
+            try:
+                structured_json_path = structured_json_future.result()
+                logger.info(f"✅ Structured contract JSON saved to: {structured_json_path}")
+            except Exception as e:
+                logger.error(f"❌ Failed to save structured contract JSON for {basename}: {str(e)}")
+                logger.error(f"❌ Stack trace: {traceback.format_exc()}")
+        
         return {
             'success': True,
             'output_files': output_files,
             'structured_json': structured_json_path,
+            'truncated': truncated,
             'pipeline_result': pipeline_result
         }
         
@@ -966,6 +1661,22 @@ def process_single_pdf(bucket_name: str, object_name: str, workspace_id: str, pr
             'success': False,
             'error': str(e)
         }
+    finally:
+        # 途中で例外が出ても、実行中のアップロードがすべて終わってから結果ディレクトリを削除する
+        concurrent.futures.wait([f for f in (*upload_futures, structured_json_future) if f is not None])
+        if result_dir is not None:
+            shutil.rmtree(result_dir, ignore_errors=True)
+
+if celery_app is not None:
+    @celery_app.task(bind=True, max_retries=3, acks_late=True, name="ocr.process_pdf")
+    def process_pdf_task(self, bucket_name: str, object_name: str, workspace_id: str, project_id: str, workspace_id_int: Optional[int] = None, selected_risk_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Celeryワーカー上でPDFを1件処理する（失敗時はリトライ）"""
+        result = process_single_pdf(bucket_name, object_name, workspace_id, project_id, workspace_id_int, selected_risk_ids)
+        if not result.get("success"):
+            logger.error(f"❌ Celery task failed for {object_name}: {result.get('error')}")
+            raise self.retry(exc=RuntimeError(result.get("error", "Processing failed")), countdown=30)
+        logger.info(f"Successfully processed PDF: {object_name}")
+        return {"success": True, "output_files": result.get("output_files", [])}
 
 def split_contracts_by_termination(articles: list) -> list:
     """
@@ -1009,82 +1720,78 @@ def split_contracts_by_termination(articles: list) -> list:
     return contracts
 
 
-def classify_contract_risks(articles: list, target_company: str, workspace_id: Optional[int] = None, selected_risk_ids: Optional[List[int]] = None, bucket_name: Optional[str] = None) -> list:
+# 1ドキュメント内の契約書ごとのリスク分類を同時にVertex AIへ送る上限（クォータ保護）
+RISK_CLASSIFICATION_CONCURRENCY = int(os.environ.get('RISK_CLASSIFICATION_CONCURRENCY', '16'))
+
+
+def build_risk_classification_model(risks: List[Dict[str, Any]]) -> "GenerativeModel":
     """
-    契約書条文からリスクを分類する（Vertex AI使用）
+    リスク分類用（setClassificationsのFunction Calling付き）のモデルを生成
 
     Args:
-        articles: 条文配列
-        target_company: 対象会社名
-        workspace_id: ワークスペースID（オプション）
-        selected_risk_ids: 選択されたリスクIDのリスト（オプション）
+        risks: DBから取得したリスクタイプ
 
     Returns:
-        リスク分類結果の配列
+        GenerativeModel
     """
-    try:
-        import vertexai
-        from vertexai.generative_models import GenerativeModel, GenerationConfig, FunctionDeclaration, Tool
-
-        project_id_env = os.getenv('GCP_PROJECT_ID')
-        location = os.getenv('GCP_LOCATION', 'us-central1')
-        if not project_id_env:
-            logger.error("GCP_PROJECT_ID環境変数が設定されていません")
-            return []
+    # リスクIDのリストを生成（文字列として）
+    risk_ids = [str(risk['id']) for risk in risks]
+
+    # Function Declaration（リスク分類結果を受け取る関数定義）
+    set_classifications_func = FunctionDeclaration(
+        name="setClassifications",
+        description="契約書のリスク分類結果を設定する",
+        parameters={
+            "type": "object",
+            "properties": {
+                "classifications": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "text": {"type": "string", "description": "リスク条文の原文"},
+                            "type": {"type": "string", "enum": risk_ids, "description": f"リスクタイプID（{', '.join(risk_ids)}）"},
+                            "reason": {"type": "string", "description": "リスクの理由"},
+                            "pageNumber": {"type": "integer", "description": "ページ番号（不明は-1）"},
+                            "articleInfo": {"type": "string", "description": "条文番号（例: 第10条）"},
+                            "articleTitle": {"type": "string", "description": "条文タイトル"},
+                            "articleOverview": {"type": "string", "description": "柱書"},
+                            "specificClause": {"type": "string", "description": "具体的な号"}
+                        },
+                        "required": ["text", "type", "reason", "pageNumber"]
+                    }
+                }
+            },
+            "required": ["classifications"]
+        }
+    )
 
-        vertexai.init(project=project_id_env, location=location)
+    # ツール設定
+    risk_classification_tool = Tool(
+        function_declarations=[set_classifications_func]
+    )
 
-        # DBからリスクタイプを取得
-        risks = get_risks_from_db(workspace_id=workspace_id, selected_risk_ids=selected_risk_ids, bucket_name=bucket_name)
-        if not risks:
-            logger.error("❌ No risks found in database")
-            return []
+    # モデル初期化
+    return GenerativeModel(
+        GEMINI_MODEL_NAME,
+        tools=[risk_classification_tool]
+    )
 
-        logger.info(f"📊 Fetched {len(risks)} risk types from database")
-
-        # リスクIDのリストを生成（文字列として）
-        risk_ids = [str(risk['id']) for risk in risks]
-
-        # Function Declaration（リスク分類結果を受け取る関数定義）
-        set_classifications_func = FunctionDeclaration(
-            name="setClassifications",
-            description="契約書のリスク分類結果を設定する",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "classifications": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "text": {"type": "string", "description": "リスク条文の原文"},
-                                "type": {"type": "string", "enum": risk_ids, "description": f"リスクタイプID（{', '.join(risk_ids)}）"},
-                                "reason": {"type": "string", "description": "リスクの理由"},
-                                "pageNumber": {"type": "integer", "description": "ページ番号（不明は-1）"},
-                                "articleInfo": {"type": "string", "description": "条文番号（例: 第10条）"},
-                                "articleTitle": {"type": "string", "description": "条文タイトル"},
-                                "articleOverview": {"type": "string", "description": "柱書"},
-                                "specificClause": {"type": "string", "description": "具体的な号"}
-                            },
-                            "required": ["text", "type", "reason", "pageNumber"]
-                        }
-                    }
-                },
-                "required": ["classifications"]
-            }
-        )
 
-        # ツール設定
-        risk_classification_tool = Tool(
-            function_declarations=[set_classifications_func]
-        )
+async def classify_contract_risks_async(articles: list, target_company: str, model: "GenerativeModel", risks: List[Dict[str, Any]]) -> list:
+    """
+    契約書条文からリスクを分類する（Vertex AI使用、非同期版）
 
-        # モデル初期化
-        model = GenerativeModel(
-            'gemini-2.5-flash',
-            tools=[risk_classification_tool]
-        )
+    Args:
+        articles: 条文配列
+        target_company: 対象会社名
+        model: build_risk_classification_model で生成したモデル
+        risks: DBから取得したリスクタイプ
 
+    Returns:
+        リスク分類結果の配列
+    """
+    try:
         # 条文一覧を構築
         articles_text = "\n".join([
             f"### {article.get('article_number', '')} {article.get('title', '')}\n{article.get('content', '')}"
@@ -1112,31 +1819,18 @@ def classify_contract_risks(articles: list, target_company: str, workspace_id: O
 """
 
         # Vertex AI呼び出し（タイムアウト対策）
-        import asyncio
-        from vertexai.generative_models import GenerationConfig
-
-        async def generate_with_timeout():
-            # Function Callingを強制するための設定
-            generation_config = GenerationConfig(
-                temperature=0.1,
-            )
-            response = await model.generate_content_async(
-                prompt,
-                generation_config=generation_config,
-            )
-            return response
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # Function Callingを強制するための設定
+        generation_config = GenerationConfig(
+            temperature=0.1,
+        )
         try:
-            response = loop.run_until_complete(
-                asyncio.wait_for(generate_with_timeout(), timeout=3600)
+            response = await asyncio.wait_for(
+                generate_content_with_retry(model, prompt, generation_config),
+                timeout=3600
             )
         except asyncio.TimeoutError:
             logger.error(f"⏱️ Timeout after 3600 seconds while classifying risks")
             return []
-        finally:
-            loop.close()
 
         # Function Callの結果を取得
         logger.info(f"📊 Response from Gemini: {response}")
@@ -1166,8 +1860,6 @@ def classify_contract_risks(articles: list, target_company: str, workspace_id: O
             logger.info(f"✅ Successfully classified {len(classifications)} risks")
 
             # IDを生成して返す
-            import time
-            import random
             return [
                 {
                     "id": f"{int(time.time() * 1000)}-{random.randint(100000, 999999)}",
@@ -1221,38 +1913,56 @@ def add_risks_to_contract_data(structured_data: Dict[str, Any], workspace_id: Op
 
         logger.info(f"📄 Found {len(contracts)} contract(s) in document")
 
-        # 各契約書ごとにリスク分類
-        contract_risks = []
-        for i, contract in enumerate(contracts):
+        # 各契約書の対象会社名を特定（2つ目以降の契約書は個別のpartyから取得）
+        contract_targets = []
+        for contract in contracts:
             contract_info = contract.get("info")
-            contract_articles = contract.get("articles", [])
-
-            # 対象会社名を特定（2つ目以降の契約書は個別のpartyから取得）
             if contract_info and "party" in contract_info:
                 contract_party = contract_info.get("party", "")
-                contract_target = contract_party.split(",")[0].strip() if contract_party else target_company
+                contract_targets.append(contract_party.split(",")[0].strip() if contract_party else target_company)
             else:
-                contract_target = target_company
+                contract_targets.append(target_company)
+
+        # リスク分類実行（リスクタイプの取得とモデル生成は1回だけ行い、契約書ごとの呼び出しは並行に送る）
+        contract_results = [[] for _ in contracts]
+        if contracts and init_vertexai():
+            risks = get_risks_from_db(workspace_id=workspace_id, selected_risk_ids=selected_risk_ids, bucket_name=bucket_name)
+            if not risks:
+                logger.error("❌ No risks found in database")
+            else:
+                logger.info(f"📊 Fetched {len(risks)} risk types from database")
+                model = build_risk_classification_model(risks)
+                semaphore = asyncio.Semaphore(RISK_CLASSIFICATION_CONCURRENCY)
+
+                async def classify(i: int, contract: Dict[str, Any]) -> list:
+                    contract_articles = contract.get("articles", [])
+                    async with semaphore:
+                        logger.info(f"🔍 Classifying risks for contract {i+1}/{len(contracts)} (target: {contract_targets[i]})")
+                        logger.info(f"📊 Contract {i+1} has {len(contract_articles)} articles")
+                        return await classify_contract_risks_async(contract_articles, contract_targets[i], model, risks)
 
-            logger.info(f"🔍 Classifying risks for contract {i+1}/{len(contracts)} (target: {contract_target})")
-            logger.info(f"📊 Contract {i+1} has {len(contract_articles)} articles")
+                async def classify_all() -> list:
+                    return await asyncio.gather(*(classify(i, contract) for i, contract in enumerate(contracts)))
 
-            # リスク分類実行（workspace_idとselected_risk_idsを渡す）
-            risks = classify_contract_risks(contract_articles, contract_target, workspace_id=workspace_id, selected_risk_ids=selected_risk_ids, bucket_name=bucket_name)
+                contract_results = get_thread_event_loop().run_until_complete(classify_all())
 
-            logger.info(f"✅ Contract {i+1} classification returned {len(risks)} risks")
-            for risk_idx, risk in enumerate(risks):
+        contract_risks = []
+        for i, (contract, classified) in enumerate(zip(contracts, contract_results)):
+            contract_articles = contract.get("articles", [])
+
+            logger.info(f"✅ Contract {i+1} classification returned {len(classified)} risks")
+            for risk_idx, risk in enumerate(classified):
                 logger.info(f"   Risk {risk_idx+1}: {risk.get('articleInfo', 'N/A')} - {risk.get('type', 'N/A')}")
 
             # 契約書ごとの情報を構築
             contract_risks.append({
                 "contractIndex": i,
-                "targetCompany": contract_target,
+                "targetCompany": contract_targets[i],
                 "articleCount": len(contract_articles),
-                "risks": risks
+                "risks": classified
             })
 
-            logger.info(f"✅ Contract {i+1} completed with {len(risks)} risks")
+            logger.info(f"✅ Contract {i+1} completed with {len(classified)} risks")
 
         # 元のデータにrisksキーを追加（契約書ごとに分割）
         total_risks = sum(len(c["risks"]) for c in contract_risks)
@@ -1273,217 +1983,193 @@ def add_risks_to_contract_data(structured_data: Dict[str, Any], workspace_id: Op
         return structured_data
 
 
-def convert_local_text_to_contract_schema(file_content: str, basename: str, workspace_id: str, project_id: str, bucket_name: str, workspace_id_int: Optional[int] = None, selected_risk_ids: Optional[List[int]] = None) -> Optional[Dict[str, Any]]:
+# OCRテキストの空白整形用（行末の空白、3行以上の空行）
+_TRAILING_SPACE_RE = re.compile(r'[ \t]+$', re.MULTILINE)
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+
+def _prepare_ocr_text(file_content: str) -> str:
     """
-    ローカルのテキストをVertex AIの構造化出力を使って契約書スキーマに変換
+    Vertex AIに送る前にOCRテキストの行末の空白と余分な空行を詰める（入力トークンの削減）
 
-    Args:
-        file_content: テキスト内容
-        basename: ファイルのベース名
-        workspace_id: ワークスペースID（文字列）
-        project_id: プロジェクトID
-        bucket_name: GCSバケット名
-        workspace_id_int: ワークスペースID（整数、リスク取得用）
-        selected_risk_ids: 選択されたリスクIDのリスト（オプション）
+    条文は原文どおりにコピーさせるため、行内の空白（表の桁揃えやインデント）や
+    文字そのもの（全角英数字や丸数字など）は変えない
+    """
+    text = _TRAILING_SPACE_RE.sub('', file_content)
+    return _BLANK_LINES_RE.sub('\n\n', text).strip('\n')
+
+
+# 構造化に送るOCRテキストの上限文字数（異常なOCR出力でトークンと待ち時間を浪費しないように、0で無制限）
+# 超えた場合は先頭と末尾（署名欄等）を残して中間を省く
+CONTRACT_TEXT_MAX_CHARS = int(os.environ.get('CONTRACT_TEXT_MAX_CHARS', '800000'))
+_CONTRACT_TEXT_TAIL_RATIO = 0.25
+
+
+def _truncate_ocr_text(file_content: str, basename: str) -> Tuple[str, bool]:
+    """
+    上限を超えるOCRテキストを先頭・末尾を残して切り詰める
 
     Returns:
-        構造化された契約書データまたはNone
+        (送信するテキスト, 切り詰めたか)
     """
-    try:
-        # Vertex AI設定
-        import vertexai
-        from vertexai.generative_models import GenerativeModel, GenerationConfig
-
-        project_id_env = os.getenv('GCP_PROJECT_ID')
-        location = os.getenv('GCP_LOCATION', 'us-central1')
-        if not project_id_env:
-            logger.error("GCP_PROJECT_ID環境変数が設定されていません")
-            return None
+    if not CONTRACT_TEXT_MAX_CHARS or len(file_content) <= CONTRACT_TEXT_MAX_CHARS:
+        return file_content, False
+    tail_chars = int(CONTRACT_TEXT_MAX_CHARS * _CONTRACT_TEXT_TAIL_RATIO)
+    head_chars = CONTRACT_TEXT_MAX_CHARS - tail_chars
+    logger.warning(f"✂️ OCR text for {basename} truncated: {len(file_content)} -> {CONTRACT_TEXT_MAX_CHARS} chars")
+    return f"{file_content[:head_chars]}\n...[truncated]...\n{file_content[-tail_chars:]}", True
 
-        vertexai.init(project=project_id_env, location=location)
 
-        # 契約書スキーマの定義
-        contract_schema = {
-            "type": "object",
-            "properties": {
-                "success": {"type": "boolean"},
-                "info": {
-                    "type": "object",
-                    "properties": {
-                        "title": {"type": "string"},
-                        "party": {"type": "string"},  # カンマ区切りの当事者名
-                        "start_date": {"type": "string"},  # 空文字列で対応
-                        "end_date": {"type": "string"},  # 空文字列で対応
-                        "conclusion_date": {"type": "string"}  # 空文字列で対応
-                    },
-                    "required": ["title", "party"]
-                },
-                "result": {
-                    "type": "object",
-                    "properties": {
-                        "articles": {
-                            "type": "array",
-                            "items": {
-                                "anyOf": [
-                                    {
-                                        "type": "object",
-                                        "properties": {
-                                            "article_number": {"type": "string"},
-                                            "title": {"type": "string"},
-                                            "content": {"type": "string"},
-                                            "table_number": {"type": "string"}
-                                        },
-                                        "required": ["content", "title"]
-                                    },
-                                    {
-                                        "type": "object",
-                                        "properties": {
-                                            "title": {"type": "string"},
-                                            "party": {"type": "string"},
-                                            "start_date": {"type": "string"},
-                                            "end_date": {"type": "string"},
-                                            "conclusion_date": {"type": "string"}
-                                        },
-                                        "required": ["title", "party"]
-                                    }
-                                ]
-                            }
-                        }
-                    },
-                    "required": ["articles"]
-                }
-            },
-            "required": ["success", "info", "result"]
-        }
+# 構造化結果のプロセス内キャッシュ（同一テキストの再送・再実行でVertex AI呼び出しを省く）
+# キーは (テキストのblake2bダイジェスト, ベース名)、値は構造化結果のJSONバイト列（呼び出し側の変更が波及しないように）
+CONTRACT_CACHE_MAX = int(os.environ.get('CONTRACT_CACHE_MAX', '512'))
+_structured_contract_cache = collections.OrderedDict()
+_structured_contract_lock = threading.Lock()
 
-        if not file_content:
-            logger.warning(f"Empty content provided")
-            return None
 
-        # Vertex AIモデルの初期化（構造化出力対応）
-        model = GenerativeModel('gemini-2.5-flash')
-        generation_config = GenerationConfig(
-            response_mime_type="application/json",
-            response_schema=contract_schema
-        )
+def _contract_cache_key(file_content: str, basename: str) -> Tuple[str, str]:
+    return hashlib.blake2b(file_content.encode('utf-8'), digest_size=16).hexdigest(), basename
 
-        # プロンプトの作成
-        prompt = f"""
-以下のOCR処理済みテキストを解析し、契約書の構造化データとして抽出してください。
 
-ファイル名: {basename}
+def get_cached_contract(key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+    """キャッシュ済みの構造化結果を取得（未登録はNone）"""
+    with _structured_contract_lock:
+        data = _structured_contract_cache.get(key)
+        if data is None:
+            return None
+        _structured_contract_cache.move_to_end(key)
+    return orjson.loads(data)
 
-テキスト内容:
-{file_content}
 
-抽出指示:
-1. success: 常にtrue
-2. info部分（1つ目の契約書の情報のみ）:
-   - title: 契約書のタイトル（見つからない場合はファイル名を使用）
-   - party: 契約当事者をカンマ区切りで記載（例: "株式会社A,株式会社B"）
-   - start_date: 契約開始日（YYYY-MM-DD形式、見つからない場合は空文字列）
-   - end_date: 契約終了日（YYYY-MM-DD形式、見つからない場合は空文字列）
-   - conclusion_date: 契約締結日（YYYY-MM-DD形式、見つからない場合は空文字列）
+def remember_contract(key: Tuple[str, str], structured_data: Dict[str, Any]) -> None:
+    """構造化に成功した結果をキャッシュに登録"""
+    if CONTRACT_CACHE_MAX <= 0:
+        return
+    data = orjson.dumps(structured_data)
+    with _structured_contract_lock:
+        _structured_contract_cache[key] = data
+        _structured_contract_cache.move_to_end(key)
+        while len(_structured_contract_cache) > CONTRACT_CACHE_MAX:
+            _structured_contract_cache.popitem(last=False)
 
-3. result部分:
-   - articles: 契約条項の配列（全ての条項を漏れなく抽出）
-     - article_number: 条項番号（例: "第1条"、"第2条"、番号がない場合は"署名欄"等）
-     - title: 条項のタイトル（見出しがない場合は内容から要約）
-     - content: 条項の完全な内容（省略禁止）
-     - table_number: 表がある場合のみ表番号
 
-重要な注意事項:
-- テキスト内の全ての条項を必ず抽出してください（第1条から最後まで）
-- 各条項のcontentは完全にコピーし、省略や要約は行わないでください
-- 条項番号が明記されていない部分（前文、署名欄、付記等）も独立した条項として扱ってください
-- 日付は可能な限りYYYY-MM-DD形式に変換してください
-- 表や図がある場合はHTML形式でcontentに含めてください
-- 署名欄も必ず1つの条項として扱ってください
-- 出力は必ず完全なJSON形式で、途中で切れることなく最後まで出力してください
+def _log_error_response_upload(future: concurrent.futures.Future) -> None:
+    """構造化エラー時のレスポンス保存の結果をログに出力"""
+    try:
+        logger.info(f"📝 Error response saved to: {future.result()}")
+    except Exception as upload_error:
+        logger.error(f"Failed to save error response: {upload_error}")
 
-【複数契約書がある場合の特別ルール】:
-1. 契約書内部ドキュメントと契約書の区切りを正確に判別:
-   - 「頭書」「要項」「契約書本文」「用紙」「条件表」「概要」「特約」「細則」「別紙」「仕様書」「別添」「図面」「約款」「派遣個別契約票契約基本情報」「定義一覧表」などは契約書の内部ドキュメントであり、区切りではありません
-   - これらは1つの契約書を構成する要素として、同じarticles配列内に含めてください
-   - ドキュメントごとのタイトル、契約当事者、契約条項、署名などの重要な情報が分割後も完全に保持されるように調査してください
-   - 分割により情報の欠如や漏れが発生しないよう、慎重に分析してください
 
-2. 契約書の終了を示す箇所（「以上」等）は、以下の形式で統一:
-   {{
-     "article_number": "",
-     "title": "契約書終了",
-     "content": "----------",
-     "table_number": ""
-   }}
+def _structure_contract(file_content: str, basename: str, err_ctx: Optional[Tuple[str, str, str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    OCRテキストをVertex AIの構造化出力を使って契約書スキーマに変換（共通処理）
 
-3. 2つ目以降の契約書が始まる場合、契約書終了の直後に契約書基本情報をそのまま挿入:
-   {{
-     "title": "[契約書タイトル]",
-     "party": "[当事者をカンマ区切り]",
-     "start_date": "[YYYY-MM-DD または空文字列]",
-     "end_date": "[YYYY-MM-DD または空文字列]",
-     "conclusion_date": "[YYYY-MM-DD または空文字列]"
-   }}
+    Args:
+        file_content: テキスト内容
+        basename: ファイルのベース名
+        err_ctx: JSONパース失敗時にレスポンスを保存する (workspace_id, project_id, bucket_name)。省略時は保存しない
 
-4. その後、2つ目の契約書の条項を続けて記載
-"""
+    Returns:
+        構造化された契約書データまたはNone
+    """
+    # 空白のみのテキストはVertex AIの準備をする前に打ち切る
+    file_content = _prepare_ocr_text(file_content)
+    if not file_content:
+        logger.warning(f"Empty content after whitespace cleanup: {basename}")
+        return None
+    file_content, truncated = _truncate_ocr_text(file_content, basename)
+    # 切り詰めたテキストの結果は中間の条文が欠けているため、キャッシュせず結果に truncated を付けて区別する
+    cache_key = None if truncated else _contract_cache_key(file_content, basename)
+    if cache_key is not None:
+        cached = get_cached_contract(cache_key)
+        if cached is not None:
+            logger.info(f"♻️ Using cached structured contract data for {basename}")
+            return cached
+
+    # Vertex AI設定（初回のみ初期化）
+    if not init_vertexai():
+        return None
 
-        # Vertex AIに送信して構造化出力を取得（タイムアウト対策）
-        # ページ数が多い場合、60秒のデフォルトタイムアウトでは不十分なため非同期版を使用
-        # asyncio.run()ではなくnew_event_loop()を使用してFlaskとの競合を回避
-        import asyncio
+    # Vertex AIモデルとプロンプトの準備（構造化出力対応）
+    model, prompt = build_contract_request(basename, file_content)
+    generation_config = get_contract_generation_config()
 
-        async def generate_with_timeout():
-            response = await model.generate_content_async(
-                prompt,
-                generation_config=generation_config
-            )
-            return response
+    # Vertex AIに送信して構造化出力を取得（タイムアウト対策）
+    # ページ数が多い場合、60秒のデフォルトタイムアウトでは不十分なため非同期版を使用
+    # モデルの非同期クライアントが束縛されるスレッド専用のイベントループで実行（Flaskとも競合しない）
+    loop = get_thread_event_loop()
+    try:
+        # 最大タイムアウト（3600秒 = 1時間、リトライ待ちを含む）を設定
+        # 注意: Cloud Runのリクエストタイムアウトも3600秒に設定する必要があります
+        response = loop.run_until_complete(
+            asyncio.wait_for(generate_content_with_retry(model, prompt, generation_config), timeout=3600)
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"⏱️ Timeout after 3600 seconds while generating structured output")
+        return None
 
-        # 新しいイベントループを作成（Flaskの既存ループと競合しない）
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # 最大タイムアウト（3600秒 = 1時間）を設定
-            # 注意: Cloud Runのリクエストタイムアウトも3600秒に設定する必要があります
-            response = loop.run_until_complete(
-                asyncio.wait_for(generate_with_timeout(), timeout=3600)
-            )
-        except asyncio.TimeoutError:
-            logger.error(f"⏱️ Timeout after 3600 seconds while generating structured output")
+    # JSONとしてパース
+    try:
+        structured_data, article_count = decode_contract_response(response.text)
+    except _CONTRACT_DECODE_ERRORS as json_error:
+        logger.error(f"Error in Vertex AI structured output: {str(json_error)}")
+        if err_ctx is None:
             return None
-        finally:
-            loop.close()
+        workspace_id, project_id, bucket_name = err_ctx
+
+        # エラー時にレスポンスをGCSに保存
+        timestamp = time.strftime('%Y%m%d_%H%M%S')
+        error_path = f"{workspace_id}/{project_id}/err/{basename}_error_{timestamp}.txt"
+
+        # 保存はアップロード用スレッドプールに任せ、失敗したリクエストをGCSの往復で待たせない
+        error_json_path = error_path.replace('.txt', '.json')
+        future = _UPLOAD_POOL.submit(
+            upload_json_to_gcs,
+            {"error": str(json_error), "response": response.text, "response_length": len(response.text)},
+            bucket_name,
+            error_json_path
+        )
+        future.add_done_callback(_log_error_response_upload)
 
-        # JSONとしてパース
-        try:
-            structured_data = json.loads(response.text)
-            logger.info(f"Successfully structured contract data with {len(structured_data.get('result', {}).get('articles', []))} articles")
+        return None
 
-            # 構造化JSON生成後、自動的にリスク分類を追加
-            structured_data = add_risks_to_contract_data(structured_data, workspace_id=workspace_id_int, selected_risk_ids=selected_risk_ids, bucket_name=bucket_name)
+    logger.info(f"Successfully structured contract data with {article_count} articles")
+    if truncated:
+        structured_data["truncated"] = True
+    else:
+        remember_contract(cache_key, structured_data)
+    return structured_data
 
-            return structured_data
-        except json.JSONDecodeError as json_error:
-            logger.error(f"Error in Vertex AI structured output: {str(json_error)}")
 
-            # エラー時にレスポンスをGCSに保存
-            from datetime import datetime
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            error_path = f"{workspace_id}/{project_id}/err/{basename}_error_{timestamp}.txt"
+def convert_local_text_to_contract_schema(file_content: str, basename: str, workspace_id: str, project_id: str, bucket_name: str, workspace_id_int: Optional[int] = None, selected_risk_ids: Optional[List[int]] = None) -> Optional[Dict[str, Any]]:
+    """
+    ローカルのテキストをVertex AIの構造化出力を使って契約書スキーマに変換
 
-            try:
-                upload_json_to_gcs(
-                    {"error": str(json_error), "response": response.text, "response_length": len(response.text)},
-                    bucket_name,
-                    error_path.replace('.txt', '.json')
-                )
-                logger.info(f"📝 Error response saved to: gs://{bucket_name}/{error_path.replace('.txt', '.json')}")
-            except Exception as upload_error:
-                logger.error(f"Failed to save error response: {upload_error}")
+    Args:
+        file_content: テキスト内容
+        basename: ファイルのベース名
+        workspace_id: ワークスペースID（文字列）
+        project_id: プロジェクトID
+        bucket_name: GCSバケット名
+        workspace_id_int: ワークスペースID（整数、リスク取得用）
+        selected_risk_ids: 選択されたリスクIDのリスト（オプション）
+
+    Returns:
+        構造化された契約書データまたはNone
+    """
+    try:
+        if not file_content:
+            logger.warning(f"Empty content provided")
+            return None
 
+        structured_data = _structure_contract(file_content, basename, err_ctx=(workspace_id, project_id, bucket_name))
+        if structured_data is None:
             return None
 
+        # 構造化JSON生成後、自動的にリスク分類を追加
+        return add_risks_to_contract_data(structured_data, workspace_id=workspace_id_int, selected_risk_ids=selected_risk_ids, bucket_name=bucket_name)
+
     except Exception as e:
         logger.error(f"Error in Vertex AI structured output: {str(e)}")
         return None
@@ -1501,179 +2187,13 @@ def convert_to_contract_schema(gcs_file_path: str, basename: str) -> Optional[Di
         構造化された契約書データまたはNone
     """
     try:
-        # Vertex AI設定
-        import vertexai
-        from vertexai.generative_models import GenerativeModel, GenerationConfig
-
-        project_id_env = os.getenv('GCP_PROJECT_ID')
-        location = os.getenv('GCP_LOCATION', 'us-central1')
-        if not project_id_env:
-            logger.error("GCP_PROJECT_ID環境変数が設定されていません")
-            return None
-
-        vertexai.init(project=project_id_env, location=location)
-        
-        # 契約書スキーマの定義
-        contract_schema = {
-            "type": "object",
-            "properties": {
-                "success": {"type": "boolean"},
-                "info": {
-                    "type": "object",
-                    "properties": {
-                        "title": {"type": "string"},
-                        "party": {"type": "string"},  # カンマ区切りの当事者名
-                        "start_date": {"type": "string"},  # 空文字列で対応
-                        "end_date": {"type": "string"},  # 空文字列で対応
-                        "conclusion_date": {"type": "string"}  # 空文字列で対応
-                    },
-                    "required": ["title", "party"]
-                },
-                "result": {
-                    "type": "object",
-                    "properties": {
-                        "articles": {
-                            "type": "array",
-                            "items": {
-                                "anyOf": [
-                                    {
-                                        "type": "object",
-                                        "properties": {
-                                            "article_number": {"type": "string"},
-                                            "title": {"type": "string"},
-                                            "content": {"type": "string"},
-                                            "table_number": {"type": "string"}
-                                        },
-                                        "required": ["content", "title"]
-                                    },
-                                    {
-                                        "type": "object",
-                                        "properties": {
-                                            "title": {"type": "string"},
-                                            "party": {"type": "string"},
-                                            "start_date": {"type": "string"},
-                                            "end_date": {"type": "string"},
-                                            "conclusion_date": {"type": "string"}
-                                        },
-                                        "required": ["title", "party"]
-                                    }
-                                ]
-                            }
-                        }
-                    },
-                    "required": ["articles"]
-                }
-            },
-            "required": ["success", "info", "result"]
-        }
-        
         # GCSからファイル内容を読み取り
         file_content = download_text_from_gcs(gcs_file_path)
         if not file_content:
             logger.warning(f"Could not read content from: {gcs_file_path}")
             return None
-        
-        # Vertex AIモデルの初期化（構造化出力対応）
-        model = GenerativeModel('gemini-2.5-flash')
-        generation_config = GenerationConfig(
-            response_mime_type="application/json",
-            response_schema=contract_schema
-        )
-
-        # プロンプトの作成
-        prompt = f"""
-以下のOCR処理済みテキストを解析し、契約書の構造化データとして抽出してください。
-
-ファイル名: {basename}
-
-テキスト内容:
-{file_content}
-
-抽出指示:
-1. success: 常にtrue
-2. info部分（1つ目の契約書の情報のみ）:
-   - title: 契約書のタイトル（見つからない場合はファイル名を使用）
-   - party: 契約当事者をカンマ区切りで記載（例: "株式会社A,株式会社B"）
-   - start_date: 契約開始日（YYYY-MM-DD形式、見つからない場合は空文字列）
-   - end_date: 契約終了日（YYYY-MM-DD形式、見つからない場合は空文字列）
-   - conclusion_date: 契約締結日（YYYY-MM-DD形式、見つからない場合は空文字列）
 
-3. result部分:
-   - articles: 契約条項の配列（全ての条項を漏れなく抽出）
-     - article_number: 条項番号（例: "第1条"、"第2条"、番号がない場合は"署名欄"等）
-     - title: 条項のタイトル（見出しがない場合は内容から要約）
-     - content: 条項の完全な内容（省略禁止）
-     - table_number: 表がある場合のみ表番号
-
-重要な注意事項:
-- テキスト内の全ての条項を必ず抽出してください（第1条から最後まで）
-- 各条項のcontentは完全にコピーし、省略や要約は行わないでください
-- 条項番号が明記されていない部分（前文、署名欄、付記等）も独立した条項として扱ってください
-- 日付は可能な限りYYYY-MM-DD形式に変換してください
-- 表や図がある場合はHTML形式でcontentに含めてください
-- 署名欄も必ず1つの条項として扱ってください
-- 出力は必ず完全なJSON形式で、途中で切れることなく最後まで出力してください
-
-【複数契約書がある場合の特別ルール】:
-1. 契約書内部ドキュメントと契約書の区切りを正確に判別:
-   - 「頭書」「要項」「契約書本文」「用紙」「条件表」「概要」「特約」「細則」「別紙」「仕様書」「別添」「図面」「約款」「派遣個別契約票契約基本情報」「定義一覧表」などは契約書の内部ドキュメントであり、区切りではありません
-   - これらは1つの契約書を構成する要素として、同じarticles配列内に含めてください
-   - ドキュメントごとのタイトル、契約当事者、契約条項、署名などの重要な情報が分割後も完全に保持されるように調査してください
-   - 分割により情報の欠如や漏れが発生しないよう、慎重に分析してください
-
-2. 契約書の終了を示す箇所（「以上」等）は、以下の形式で統一:
-   {{
-     "article_number": "",
-     "title": "契約書終了",
-     "content": "----------",
-     "table_number": ""
-   }}
-
-3. 2つ目以降の契約書が始まる場合、契約書終了の直後に契約書基本情報をそのまま挿入:
-   {{
-     "title": "[契約書タイトル]",
-     "party": "[当事者をカンマ区切り]",
-     "start_date": "[YYYY-MM-DD または空文字列]",
-     "end_date": "[YYYY-MM-DD または空文字列]",
-     "conclusion_date": "[YYYY-MM-DD または空文字列]"
-   }}
-
-4. その後、2つ目の契約書の条項を続けて記載
-"""
-
-        # Vertex AIに送信して構造化出力を取得（タイムアウト対策）
-        # ページ数が多い場合、60秒のデフォルトタイムアウトでは不十分なため非同期版を使用
-        # asyncio.run()ではなくnew_event_loop()を使用してFlaskとの競合を回避
-        import asyncio
-
-        async def generate_with_timeout():
-            response = await model.generate_content_async(
-                prompt,
-                generation_config=generation_config
-            )
-            return response
-
-        # 新しいイベントループを作成（Flaskの既存ループと競合しない）
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # 最大タイムアウト（3600秒 = 1時間）を設定
-            # 注意: Cloud Runのリクエストタイムアウトも3600秒に設定する必要があります
-            response = loop.run_until_complete(
-                asyncio.wait_for(generate_with_timeout(), timeout=3600)
-            )
-        except asyncio.TimeoutError:
-            logger.error(f"⏱️ Timeout after 3600 seconds while generating structured output")
-            return None
-        finally:
-            loop.close()
-
-        # JSONとしてパース
-        structured_data = json.loads(response.text)
-
-        logger.info(f"Successfully structured contract data with {len(structured_data.get('result', {}).get('articles', []))} articles")
-
-        return structured_data
+        return _structure_contract(file_content, basename)
 
     except Exception as e:
         logger.error(f"Error in Vertex AI structured output: {str(e)}")
@@ -1696,114 +2216,121 @@ def download_text_from_gcs(gcs_path: str) -> Optional[str]:
         if not gcs_path.startswith('gs://'):
             return None
             
-        path_parts = gcs_path.replace('gs://', '').split('/', 1)
-        bucket_name = path_parts[0]
-        blob_name = path_parts[1]
+        bucket_name, blob_name = parse_gcs_uri(gcs_path)
         
         # GCSクライアントでファイルを読み取り
-        client = storage.Client()
-        bucket = client.bucket(bucket_name)
+        bucket = get_bucket(bucket_name)
         blob = bucket.blob(blob_name)
         
-        # テキストとして読み取り
-        content = blob.download_as_text(encoding='utf-8')
-        
-        return content
+        # bytesで取得してUTF-8として1回だけデコード
+        return blob.download_as_bytes().decode('utf-8')
         
     except Exception as e:
         logger.error(f"Error downloading text from GCS: {str(e)}")
         return None
 
+def _nfc(s: str) -> str:
+    """NFC正規化（ASCIIのみの名前は正規化済みのため、そのまま返す）"""
+    return s if s.isascii() else unicodedata.normalize('NFC', s)
+
+
 def download_from_gcs(gcs_uri: str, local_path: str) -> str:
     """
     GCSからファイルをダウンロード
     """
-    if not gcs_uri.startswith('gs://'):
-        raise ValueError(f"Invalid GCS URI: {gcs_uri}")
-    
-    path_parts = gcs_uri[5:].split('/', 1)
-    if len(path_parts) != 2:
+    bucket_name, blob_path = parse_gcs_uri(gcs_uri)
+    if not blob_path:
         raise ValueError(f"Invalid GCS URI format: {gcs_uri}")
     
-    bucket_name, blob_path = path_parts
-    
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    
-    # Try to find the blob directly first
-    try:
-        blob = bucket.blob(blob_path)
-        logger.info(f"Downloading {gcs_uri} to {local_path}")
-        blob.download_to_filename(local_path)
+    bucket = get_bucket(bucket_name)
+
+    # まずはパスを直接参照（日本語ファイル名のNFC/NFD表記揺れも個別に試す、いずれもO(1)）
+    candidates = list(dict.fromkeys(
+        [blob_path, _nfc(blob_path), unicodedata.normalize('NFD', blob_path)]
+    ))
+    # 存在するblobのダウンロード失敗（一時的なエラー等）は一覧での探索に回さず、そのまま呼び出し元に送出する
+    for candidate in candidates:
+        # サイズによってダウンロード方法を切り替えるため、メタデータを取得（存在しなければNone）
+        blob = bucket.get_blob(candidate)
+        if blob is None:
+            continue
+        logger.info(f"Downloading gs://{bucket_name}/{blob.name} to {local_path} ({blob.size} bytes)")
+        _download_blob_to_file(blob, local_path)
         return local_path
-    except Exception as e:
-        logger.warning(f"Direct download failed: {e}")
-        
-        # If direct access fails, try to list and find matching blobs
-        logger.info(f"Searching for blobs matching: {blob_path}")
-        
-        # Get the directory path and filename
-        path_parts = blob_path.split('/')
-        if len(path_parts) > 1:
-            prefix = '/'.join(path_parts[:-1]) + '/'
-            target_filename = path_parts[-1]
-        else:
-            prefix = ''
-            target_filename = blob_path
-            
-        logger.info(f"Listing blobs with prefix: {prefix}")
-        blobs = list(bucket.list_blobs(prefix=prefix))
-        logger.info(f"Found {len(blobs)} blobs with prefix")
-        
-        # Look for exact or partial matches
-        for blob in blobs:
-            blob_filename = blob.name.split('/')[-1]
-            logger.info(f"Checking blob: {blob.name} (filename: {blob_filename})")
-            
-            # Normalize Unicode for comparison
-            import unicodedata
-            normalized_blob_name = unicodedata.normalize('NFC', blob.name)
-            normalized_blob_filename = unicodedata.normalize('NFC', blob_filename)
-            normalized_target_filename = unicodedata.normalize('NFC', target_filename)
-            normalized_blob_path = unicodedata.normalize('NFC', blob_path)
-            
-            # Try multiple matching strategies with normalized strings
-            match_found = (
-                normalized_blob_filename == normalized_target_filename or  # Exact match
-                normalized_target_filename in normalized_blob_filename or  # Target is substring of blob
-                normalized_blob_filename in normalized_target_filename or  # Blob is substring of target
-                normalized_blob_name == normalized_blob_path or           # Full path exact match
-                normalized_blob_name.endswith(normalized_target_filename) or  # Ends with target filename
-                # Also try without normalization for backward compatibility
-                blob_filename == target_filename or
-                target_filename in blob_filename or
-                blob_filename in target_filename or
-                blob.name == blob_path or
-                blob.name.endswith(target_filename)
-            )
-            
-            if match_found:
-                logger.info(f"Found matching blob: {blob.name}")
-                try:
-                    blob.download_to_filename(local_path)
-                    return local_path
-                except Exception as download_error:
-                    logger.warning(f"Failed to download {blob.name}: {download_error}")
-                    continue
 
-        raise FileNotFoundError(f"Could not find or download blob matching: {blob_path}")
+    # 直接参照で見つからない場合のみ、同じディレクトリを一覧して正規化したファイル名で照合
+    logger.info(f"Searching for blobs matching: {blob_path}")
+
+    # Get the directory path and filename
+    path_parts = blob_path.split('/')
+    if len(path_parts) > 1:
+        prefix = '/'.join(path_parts[:-1]) + '/'
+        target_filename = path_parts[-1]
+    else:
+        prefix = ''
+        target_filename = blob_path
+    normalized_target_filename = _nfc(target_filename)
+
+    logger.info(f"Listing blobs with prefix: {prefix}")
+    # 一覧はページ単位で遅延取得し、正規化後のファイル名が完全一致したところで打ち切る
+    # 部分一致（前方・後方一致を含む）は完全一致が無かった場合の候補として一覧順に試す
+    partial_matches = []
+    # delimiter='/' で直下のオブジェクトのみに絞り、ダウンロードに必要なフィールドだけを取得する
+    listing = bucket.list_blobs(
+        prefix=prefix,
+        delimiter='/',
+        fields="items(name,size,generation),prefixes,nextPageToken",
+    )
+    for blob in listing:
+        normalized_blob_filename = _nfc(blob.name.rsplit('/', 1)[-1])
+        if normalized_blob_filename == normalized_target_filename:
+            logger.info(f"Found matching blob: {blob.name}")
+            try:
+                _download_blob_to_file(blob, local_path)
+                return local_path
+            except Exception as download_error:
+                logger.warning(f"Failed to download {blob.name}: {download_error}")
+        elif (normalized_target_filename in normalized_blob_filename or
+                normalized_blob_filename in normalized_target_filename):
+            partial_matches.append(blob)
+
+    for blob in partial_matches:
+        logger.info(f"Found partially matching blob: {blob.name}")
+        try:
+            _download_blob_to_file(blob, local_path)
+            return local_path
+        except Exception as download_error:
+            logger.warning(f"Failed to download {blob.name}: {download_error}")
+
+    raise FileNotFoundError(f"Could not find or download blob matching: {blob_path}")
+
+
+def _download_blob_to_file(blob: storage.Blob, local_path: str) -> None:
+    """メタデータ取得済みのblobをサイズに応じた方法でダウンロード"""
+    if blob.size and blob.size > GCS_SLICED_DOWNLOAD_CHUNK_SIZE:
+        # 大きなPDFはRange GETを並列に発行して1ストリームの帯域制限を回避
+        transfer_manager.download_chunks_concurrently(
+            blob,
+            local_path,
+            chunk_size=GCS_SLICED_DOWNLOAD_CHUNK_SIZE,
+            max_workers=GCS_SLICED_DOWNLOAD_WORKERS,
+            worker_type=transfer_manager.THREAD,
+        )
+    else:
+        blob.chunk_size = GCS_CHUNK_SIZE
+        # raw_download=True でgzipトランスコーディングの判定を省く
+        blob.download_to_filename(local_path, raw_download=True)
 
 def upload_file_to_gcs(local_path: str, bucket_name: str, blob_name: str) -> str:
     """
     ファイルをGCSにアップロード
     """
     
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
+    bucket = get_bucket(bucket_name)
+    blob = bucket.blob(blob_name, chunk_size=GCS_CHUNK_SIZE)
     
     logger.info(f"Uploading {local_path} to gs://{bucket_name}/{blob_name}")
-    blob.upload_from_filename(local_path)
+    blob.upload_from_filename(local_path, timeout=GCS_UPLOAD_TIMEOUT)
     
     return f"gs://{bucket_name}/{blob_name}"
 
@@ -1812,34 +2339,23 @@ def upload_json_to_gcs(json_data: Dict[str, Any], bucket_name: str, blob_path: s
     JSONデータをGCSにアップロード
     """
     
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
+    bucket = get_bucket(bucket_name)
     blob = bucket.blob(blob_path)
     
-    json_str = json.dumps(json_data, ensure_ascii=False, indent=2)
+    # インデントなしのbytesのままアップロード（転送量とシリアライズのCPUを抑え、str→bytesの再エンコードも省く）
+    # DEBUG時のみ目視しやすいように整形する
+    option = ORJSON_OPTIONS | orjson.OPT_INDENT_2 if logger.isEnabledFor(logging.DEBUG) else ORJSON_OPTIONS
+    json_bytes = orjson.dumps(json_data, option=option)
+    if GCS_JSON_GZIP_MIN_BYTES and len(json_bytes) > GCS_JSON_GZIP_MIN_BYTES:
+        blob.content_encoding = 'gzip'
+        json_bytes = gzip.compress(json_bytes, compresslevel=1)
     
     logger.info(f"Uploading JSON to gs://{bucket_name}/{blob_path}")
-    blob.upload_from_string(json_str, content_type='application/json')
+    # タイムアウトを明示し、リトライ待ちでワーカーが無期限に止まらないようにする
+    blob.upload_from_string(json_bytes, content_type='application/json; charset=utf-8', timeout=GCS_UPLOAD_TIMEOUT)
     
     return f"gs://{bucket_name}/{blob_path}"
 
-def upload_results_to_gcs(result: Dict[str, Any], bucket_name: str, prefix: str) -> str:
-    """
-    処理結果をGCSにアップロード
-    """
-    
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    
-    result_json = json.dumps(result, ensure_ascii=False, indent=2)
-    blob_name = f"{prefix}result.json"
-    blob = bucket.blob(blob_name)
-    
-    logger.info(f"Uploading results to gs://{bucket_name}/{blob_name}")
-    blob.upload_from_string(result_json, content_type='application/json')
-    
-    return f"gs://{bucket_name}/{blob_name}"
-
 
 # ================================
 # Test Endpoints for DB Connection
@@ -1932,6 +2448,11 @@ def test_get_risks():
         }), 500
 
 
+# アプリケーション起動時にモデル初期化とパイプライン構築をバックグラウンドで開始
+start_warmup()
+
+
 if __name__ == '__main__':
+    logger.warning("⚠️ Flask development server is for local use only. In production run: gunicorn -c gunicorn_conf.py src.api.main:app")
     port = int(os.environ.get('PORT', 8080))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
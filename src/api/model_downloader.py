@@ -3,10 +3,17 @@ Cloud Storageからモデルファイルをダウンロード（Cloud Run用）
 """
 import os
 import logging
+import threading
+import concurrent.futures
 from pathlib import Path
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
 from typing import Dict, List, Any
 
+# これより大きいモデルファイルはRange GETを並列発行してダウンロードする（スライスサイズを兼ねる）
+SLICED_DOWNLOAD_CHUNK_SIZE = 32 * 1024 * 1024
+SLICED_DOWNLOAD_WORKERS = 8
+
 logger = logging.getLogger(__name__)
 
 class ModelDownloader:
@@ -36,26 +43,46 @@ class ModelDownloader:
             
             logger.info(f"📥 Downloading {source_blob_name} from GCS...")
             
+            # 途中のファイルを他プロセスが完成品と誤認しないよう、一時ファイルに書き込んでから置き換える
+            temp_file = destination_file.with_name(f".{destination_file.name}.{os.getpid()}.{threading.get_ident()}.part")
+            
             client = self._get_storage_client()
             bucket = client.bucket(self.bucket_name)
-            blob = bucket.blob(source_blob_name)
+            # 存在確認とサイズ取得を1回のメタデータ取得で行う（存在しなければNone）
+            blob = bucket.get_blob(source_blob_name)
             
-            if not blob.exists():
+            if blob is None:
                 logger.error(f"❌ File not found: gs://{self.bucket_name}/{source_blob_name}")
                 return False
             
-            blob.reload()
             blob_size = blob.size
             logger.info(f"📊 Download size: {blob_size/1024/1024:.1f}MB")
             
-            blob.download_to_filename(str(destination_file))
+            try:
+                if blob_size and blob_size > SLICED_DOWNLOAD_CHUNK_SIZE:
+                    # 大きな重みファイルは並列Range GETで1ストリームの帯域制限を回避
+                    transfer_manager.download_chunks_concurrently(
+                        blob,
+                        str(temp_file),
+                        chunk_size=SLICED_DOWNLOAD_CHUNK_SIZE,
+                        max_workers=SLICED_DOWNLOAD_WORKERS,
+                        worker_type=transfer_manager.THREAD,
+                    )
+                else:
+                    blob.download_to_filename(str(temp_file))
+                
+                downloaded_size = temp_file.stat().st_size
+                if blob_size is not None and downloaded_size != blob_size:
+                    logger.error(f"❌ Size mismatch: expected={blob_size}, actual={downloaded_size}")
+                    return False
+                
+                # 同一ファイルシステム内のrenameはアトミックなので、存在するファイルは常に完成品になる
+                os.replace(temp_file, destination_file)
+            finally:
+                temp_file.unlink(missing_ok=True)
             
-            downloaded_size = destination_file.stat().st_size
             logger.info(f"✅ {destination_file.name} downloaded ({downloaded_size/1024/1024:.1f}MB)")
             
-            if downloaded_size != blob_size:
-                logger.warning(f"⚠️ Size mismatch: expected={blob_size}, actual={downloaded_size}")
-            
             return True
             
         except Exception as e:
@@ -90,20 +117,25 @@ class ModelDownloader:
         logger.info(f"🚀 Starting model download from gs://{self.bucket_name}")
         logger.info(f"📁 Models directory: {self.models_dir}")
         
-        success_count = 0
-        total_count = 0
-        
+        downloads = []
         for model_type, config in models.items():
             logger.info(f"📂 Processing {model_type} models")
             
             for file_info in config["files"]:
-                total_count += 1
-                filepath = config["dir"] / file_info["filename"]
-                
-                if self.download_file(file_info["gcs_path"], filepath):
-                    success_count += 1
-                else:
-                    logger.error(f"Failed to download {file_info['filename']}")
+                downloads.append((file_info["gcs_path"], config["dir"] / file_info["filename"]))
+        
+        # クライアントはスレッド間で共有するため、並列ダウンロードの前に生成しておく
+        self._get_storage_client()
+        
+        # モデルファイルは互いに独立しているため並列にダウンロード（起動時間の短縮）
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(downloads), thread_name_prefix="model-download") as executor:
+            results = list(executor.map(lambda d: self.download_file(*d), downloads))
+        
+        total_count = len(downloads)
+        success_count = sum(results)
+        for (gcs_path, filepath), ok in zip(downloads, results):
+            if not ok:
+                logger.error(f"Failed to download {filepath.name}")
         
         logger.info(f"📊 Download result: {success_count}/{total_count} successful")
         
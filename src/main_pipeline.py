@@ -327,13 +327,15 @@ class DocumentOCRPipeline:
         
         return self.step7_processor.process_step6_results(step6_result, session_dirs)
 
-    async def process_pdf(self, pdf_path: str, output_session_id: Optional[str] = None) -> Dict:
+    async def process_pdf(self, pdf_path: str, output_session_id: Optional[str] = None,
+                          result_dir: Optional[str] = None) -> Dict:
         """
         PDFファイルを処理するメインメソッド（Step1のみ実装）
         
         Args:
             pdf_path (str): 処理対象のPDFファイルパス
             output_session_id (str, optional): 出力セッションID
+            result_dir (str, optional): Step7の最終出力先（省略時は設定の result_base_dir）
             
         Returns:
             Dict: 処理結果の詳細情報
@@ -346,6 +348,8 @@ class DocumentOCRPipeline:
         
         # セッション用ディレクトリの作成
         session_dirs = self.directory_manager.create_session_directories(output_session_id)
+        if result_dir:
+            session_dirs["result_dir"] = result_dir
         
         # 処理結果を記録
         pipeline_result = {
@@ -441,6 +445,26 @@ class DocumentOCRPipeline:
             return pipeline_result
     
     
+def run(pdf_path: str, pipeline: Optional[DocumentOCRPipeline] = None, session_id: Optional[str] = None,
+        result_dir: Optional[str] = None) -> Dict:
+    """
+    PDFを1件処理して結果をdictで返す（API等からのインプロセス呼び出し用）
+
+    Args:
+        pdf_path: 処理対象のPDFファイルパス
+        pipeline: 構築済みのパイプライン（省略時は config.yml から構築）
+        session_id: セッションID（省略時は自動生成）
+        result_dir: 最終結果の出力先ディレクトリ（省略時は設定の result_base_dir）
+
+    Returns:
+        Dict: process_pdf の処理結果
+    """
+    if pipeline is None:
+        config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.yml")
+        pipeline = DocumentOCRPipeline(config_path)
+    return asyncio.run(pipeline.process_pdf(pdf_path, session_id, result_dir))
+
+
 def main():
     """
     メイン実行関数 (Step1 PDF変換対応版)
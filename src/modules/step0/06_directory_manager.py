@@ -4,6 +4,7 @@
 """
 
 import os
+import shutil
 import logging
 from typing import Dict
 # from src.utils.file_utils import ensure_directory  # 一旦コメントアウト
@@ -15,6 +16,16 @@ def ensure_directory(path: str):
 
 logger = logging.getLogger(__name__)
 
+# セッション毎に data/output/<dir_name>/<session_id> として作成する中間ディレクトリ
+SESSION_DIR_NAMES = [
+    "converted_images",
+    "llm_judgments",
+    "dewarped",
+    "split_images",
+    "super_resolved",
+    "final_results"
+]
+
 
 class DirectoryManager:
     """作業ディレクトリを管理するクラス"""
@@ -56,16 +67,7 @@ class DirectoryManager:
         base_output = self.dirs.get("output", "data/output")
         session_dirs = {}
         
-        dir_names = [
-            "converted_images",
-            "llm_judgments",
-            "dewarped",
-            "split_images",
-            "super_resolved",
-            "final_results"
-        ]
-        
-        for dir_name in dir_names:
+        for dir_name in SESSION_DIR_NAMES:
             dir_path = os.path.join(base_output, dir_name, session_id)
             ensure_directory(dir_path)
             session_dirs[dir_name] = dir_path
@@ -74,4 +76,18 @@ class DirectoryManager:
         # session_id自体も辞書に追加（Step7等で使用）
         session_dirs["session_id"] = session_id
 
-        return session_dirs
\ No newline at end of file
+        return session_dirs
+
+    def remove_session_directories(self, session_id: str) -> None:
+        """
+        セッション用の中間ディレクトリを削除（API等で処理完了後に呼び出す）
+        
+        Args:
+            session_id (str): セッションID
+        """
+        base_output = self.dirs.get("output", "data/output")
+        
+        for dir_name in SESSION_DIR_NAMES:
+            dir_path = os.path.join(base_output, dir_name, session_id)
+            shutil.rmtree(dir_path, ignore_errors=True)
+            logger.debug(f"セッションディレクトリ削除: {dir_name} -> {dir_path}")
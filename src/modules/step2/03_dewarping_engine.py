@@ -12,6 +12,9 @@ import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# process_image に検出結果が渡されなかったことを示す番兵（None は「検出失敗」を意味するため区別する）
+_CORNERS_NOT_GIVEN = object()
+
 
 class DewarpingEngine:
     """歪み補正処理専用クラス"""
@@ -32,6 +35,8 @@ class DewarpingEngine:
         self.yolo_device = self.config.get('yolo_device', 'cpu')
         self.crop_margin_px = self.config.get('crop_margin_px', 0)
         self.mask_dilation_px = self.config.get('mask_dilation_px', 15)
+        # YOLO推論を1回のpredict呼び出しでまとめて行うページ数
+        self.yolo_batch_size = max(1, int(self.config.get('yolo_batch_size', 8)))
         
         self.yolo_model = None
         
@@ -72,41 +77,48 @@ class DewarpingEngine:
         Returns:
             Optional[np.ndarray]: 四隅の座標 [4x2] or None
         """
+        return self._detect_document_corners_batch([image])[0]
+    
+    def _detect_document_corners_batch(self, images: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        """
+        複数画像の文書四隅をYOLOのバッチ推論で検出
+        
+        Args:
+            images (List[np.ndarray]): 入力画像リスト
+            
+        Returns:
+            List[Optional[np.ndarray]]: 画像ごとの四隅の座標 [4x2] or None
+        """
+        corners_list: List[Optional[np.ndarray]] = [None] * len(images)
         try:
-            if not self._load_yolo_model():
-                return None
+            if not images or not self._load_yolo_model():
+                return corners_list
             
-            # YOLO推論
+            # YOLO推論（リストを渡すと1回のforwardでまとめて推論される）
             results = self.yolo_model.predict(
-                image,
+                images,
                 conf=self.confidence_threshold,
                 verbose=False
             )
             
-            if not results or len(results) == 0:
-                return None
-            
-            result = results[0]
-            
-            # 最も信頼度の高い検出結果を取得
-            if result.boxes is not None and len(result.boxes) > 0:
-                # バウンディングボックスから四隅を推定
-                box = result.boxes[0].xyxy[0].cpu().numpy()  # [x1, y1, x2, y2]
-                
-                corners = np.array([
-                    [box[0], box[1]],  # 左上
-                    [box[2], box[1]],  # 右上
-                    [box[2], box[3]],  # 右下
-                    [box[0], box[3]]   # 左下
-                ], dtype=np.float32)
-                
-                return corners
+            for i, result in enumerate(results or []):
+                # 最も信頼度の高い検出結果を取得
+                if result.boxes is not None and len(result.boxes) > 0:
+                    # バウンディングボックスから四隅を推定
+                    box = result.boxes[0].xyxy[0].cpu().numpy()  # [x1, y1, x2, y2]
+                    
+                    corners_list[i] = np.array([
+                        [box[0], box[1]],  # 左上
+                        [box[2], box[1]],  # 右上
+                        [box[2], box[3]],  # 右下
+                        [box[0], box[3]]   # 左下
+                    ], dtype=np.float32)
             
-            return None
+            return corners_list
             
         except Exception as e:
             logger.error(f"文書検出エラー: {e}")
-            return None
+            return corners_list
     
     def _create_dewarp_grid(self, image_shape: Tuple[int, int], corners: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         """
@@ -245,13 +257,16 @@ class DewarpingEngine:
         
         return needs_dewarping
     
-    def process_image(self, image_path: str, output_path: str) -> Dict:
+    def process_image(self, image_path: str, output_path: str,
+                      image: Optional[np.ndarray] = None, corners=_CORNERS_NOT_GIVEN) -> Dict:
         """
         画像の歪み補正を実行
         
         Args:
             image_path (str): 入力画像パス
             output_path (str): 出力画像パス
+            image (Optional[np.ndarray]): 読み込み済みの入力画像（省略時は image_path から読み込む）
+            corners: バッチ推論済みの四隅座標（省略時はこの画像単体で検出する）
             
         Returns:
             Dict: 処理結果
@@ -266,7 +281,8 @@ class DewarpingEngine:
                     "error": f"入力画像が見つかりません: {image_path}"
                 }
             
-            image = cv2.imread(image_path)
+            if image is None:
+                image = cv2.imread(image_path)
             if image is None:
                 return {
                     "success": False,
@@ -276,16 +292,17 @@ class DewarpingEngine:
             original_height, original_width = image.shape[:2]
             
             # YOLOモデルで文書検出
-            corners = self._detect_document_corners(image)
+            if corners is _CORNERS_NOT_GIVEN:
+                corners = self._detect_document_corners(image)
             if corners is None:
                 logger.debug("文書検出失敗 - 元画像をそのまま出力")
                 
                 # 出力ディレクトリ作成
                 os.makedirs(os.path.dirname(output_path), exist_ok=True)
                 
-                # 元画像をコピー
+                # 元画像をコピー（copyfileはLinuxではsendfileによるカーネル内コピーになり、メタデータのコピーも省ける）
                 import shutil
-                shutil.copy2(image_path, output_path)
+                shutil.copyfile(image_path, output_path)
                 
                 return {
                     "success": True,
@@ -364,6 +381,7 @@ class DewarpingEngine:
         try:
             processed_count = 0
             results = []
+            targets = []
             
             for page_judgment in page_judgments:
                 page_number = page_judgment.get("page_number")
@@ -388,8 +406,28 @@ class DewarpingEngine:
                     output_filename = f"{base_name}_dewarped.jpg"
                     output_path = os.path.join(output_dir, output_filename)
                     
-                    # 歪み補正実行
-                    dewarp_result = self.process_image(input_path, output_path)
+                    targets.append((page_judgment, input_path, output_path))
+                else:
+                    # 歪み補正不要
+                    page_judgment["dewarping_applied"] = False
+                    logger.debug(f"ページ {page_number}: 歪み補正不要")
+            
+            # 対象ページを yolo_batch_size 件ずつまとめてYOLO推論し、その後ページ毎に補正する
+            for start in range(0, len(targets), self.yolo_batch_size):
+                chunk = targets[start:start + self.yolo_batch_size]
+                images = [cv2.imread(input_path) if os.path.exists(input_path) else None
+                          for _, input_path, _ in chunk]
+                loaded = [image for image in images if image is not None]
+                detected = iter(self._detect_document_corners_batch(loaded))
+                
+                for (page_judgment, input_path, output_path), image in zip(chunk, images):
+                    page_number = page_judgment.get("page_number")
+                    
+                    # 歪み補正実行（読み込み失敗時は process_image 側でエラーを返す）
+                    if image is None:
+                        dewarp_result = self.process_image(input_path, output_path)
+                    else:
+                        dewarp_result = self.process_image(input_path, output_path, image=image, corners=next(detected))
                     results.append(dewarp_result)
                     
                     if dewarp_result.get("success"):
@@ -403,10 +441,6 @@ class DewarpingEngine:
                         page_judgment["dewarping_applied"] = False
                         page_judgment["dewarping_result"] = dewarp_result
                         logger.warning(f"ページ {page_number} 歪み補正失敗: {dewarp_result.get('error')}")
-                else:
-                    # 歪み補正不要
-                    page_judgment["dewarping_applied"] = False
-                    logger.debug(f"ページ {page_number}: 歪み補正不要")
             
             return {
                 "success": True,
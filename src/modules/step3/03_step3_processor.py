@@ -4,6 +4,7 @@ Step3統合処理モジュール
 """
 
 import os
+import asyncio
 import logging
 from typing import Dict, List, Optional
 
@@ -70,8 +71,6 @@ class Step3Processor:
             logger.info(f"Step3処理開始: {len(page_judgments)}ページ対象 (非同期並列処理)")
             
             # 非同期並列処理でページを処理
-            import asyncio
-            
             # 処理対象ページのタスクを作成
             tasks = []
             valid_pages = []
@@ -184,14 +183,15 @@ class Step3Processor:
                 result["error"] = "処理対象画像がありません"
                 return result
             
-            # 各画像に対して回転判定・補正を実行（非同期）
+            # 各画像に対して回転判定・補正を実行（ページ内の画像も並列、結果は画像順）
             new_paths = []
             
-            for img_idx, img_path in enumerate(proc_images):
-                img_result = await self._process_single_image(
-                    img_path, page_number, img_idx + 1, len(proc_images)
-                )
-                
+            img_results = await asyncio.gather(*(
+                self._process_single_image(img_path, page_number, img_idx + 1, len(proc_images))
+                for img_idx, img_path in enumerate(proc_images)
+            ))
+            
+            for img_path, img_result in zip(proc_images, img_results):
                 result["image_results"].append(img_result)
                 
                 if img_result.get("success"):
@@ -275,8 +275,8 @@ class Step3Processor:
                     "detection_confidence": detection_result.confidence
                 }
             
-            # 画像を回転
-            rotation_result = self.image_rotator.rotate_image(img_path, angle)
+            # 画像を回転（画像処理はスレッドで行い、他ページのLLM待ちを止めない）
+            rotation_result = await asyncio.to_thread(self.image_rotator.rotate_image, img_path, angle)
             
             if rotation_result.get("success"):
                 output_path = rotation_result.get("output_path")
@@ -4,6 +4,7 @@ Step4統合処理モジュール
 """
 
 import os
+import asyncio
 import logging
 from typing import Dict, List, Optional
 
@@ -94,15 +95,14 @@ class Step4Processor:
                     "error": "処理対象画像がありません"
                 }
             
-            # 各画像に対してLLM判定を実行
-            individual_results = []
+            # 各画像に対してLLM判定を実行（ページ内の画像も並列、結果は画像順）
             prompts = self.prompts.get("page_count_etc_judgment", {})
+            individual_results = list(await asyncio.gather(*(
+                self.page_count_evaluator.evaluate_page_count(img_path, prompts)
+                for img_path in proc_images
+            )))
             
-            for idx, img_path in enumerate(proc_images):
-                # LLM評価を実行
-                result = await self.page_count_evaluator.evaluate_page_count(img_path, prompts)
-                individual_results.append(result)
-                
+            for idx, result in enumerate(individual_results):
                 # 結果を保存
                 if result.get("success"):
                     if len(proc_images) > 1:
@@ -281,8 +281,6 @@ class Step4Processor:
             logger.info(f"Step4処理開始: {len(page_results)}ページ対象 (非同期並列処理)")
             
             # Step4-1: ページ数等判定（並列処理）
-            import asyncio
-            
             # ページ数等判定タスクを作成
             tasks = []
             valid_pages = []
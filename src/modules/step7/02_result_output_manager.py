@@ -45,16 +45,19 @@ class ResultOutputManager:
         """
         logger.debug(f"統合結果保存開始: セッション={session_id}")
         
+        # 呼び出し側がセッション専用の出力先を指定していればそちらを使用
+        result_dir = session_dirs.get("result_dir") or self.result_base_dir
+        
         try:
             # resultディレクトリを作成
-            os.makedirs(self.result_base_dir, exist_ok=True)
+            os.makedirs(result_dir, exist_ok=True)
             
             saved_files = []
             errors = []
             
             # Gemini統合テキストを保存
             gemini_result = self._save_gemini_text(
-                integration_result, session_id
+                integration_result, session_id, result_dir
             )
             if gemini_result["success"]:
                 saved_files.extend(gemini_result["saved_files"])
@@ -63,7 +66,7 @@ class ResultOutputManager:
             
             # Document AI統合テキストを保存
             document_ai_result = self._save_document_ai_text(
-                integration_result, session_id
+                integration_result, session_id, result_dir
             )
             if document_ai_result["success"]:
                 saved_files.extend(document_ai_result["saved_files"])
@@ -73,7 +76,7 @@ class ResultOutputManager:
             # メタデータ保存
             if self.include_metadata:
                 metadata_result = self._save_metadata(
-                    integration_result, session_dirs, session_id
+                    integration_result, session_dirs, session_id, result_dir
                 )
                 if metadata_result["success"]:
                     saved_files.extend(metadata_result["saved_files"])
@@ -100,13 +103,15 @@ class ResultOutputManager:
                 "total_files": 0
             }
     
-    def _save_gemini_text(self, integration_result: Dict, session_id: str) -> Dict:
+    def _save_gemini_text(self, integration_result: Dict, session_id: str,
+                          result_dir: Optional[str] = None) -> Dict:
         """
         Gemini統合テキストを保存
         
         Args:
             integration_result: 統合結果
             session_id: セッションID
+            result_dir: 出力先ディレクトリ（省略時は result_base_dir）
             
         Returns:
             Dict: 保存結果
@@ -122,7 +127,7 @@ class ResultOutputManager:
             
             # ファイル名生成
             filename = f"gemini_integrated_{session_id}.txt"
-            filepath = os.path.join(self.result_base_dir, filename)
+            filepath = os.path.join(result_dir or self.result_base_dir, filename)
             
             # テキストファイル保存
             with open(filepath, 'w', encoding=self.encoding) as f:
@@ -145,13 +150,15 @@ class ResultOutputManager:
                 "saved_files": []
             }
     
-    def _save_document_ai_text(self, integration_result: Dict, session_id: str) -> Dict:
+    def _save_document_ai_text(self, integration_result: Dict, session_id: str,
+                               result_dir: Optional[str] = None) -> Dict:
         """
         Document AI統合テキストを保存
         
         Args:
             integration_result: 統合結果
             session_id: セッションID
+            result_dir: 出力先ディレクトリ（省略時は result_base_dir）
             
         Returns:
             Dict: 保存結果
@@ -167,7 +174,7 @@ class ResultOutputManager:
             
             # ファイル名生成
             filename = f"document_ai_integrated_{session_id}.txt"
-            filepath = os.path.join(self.result_base_dir, filename)
+            filepath = os.path.join(result_dir or self.result_base_dir, filename)
             
             # テキストファイル保存
             with open(filepath, 'w', encoding=self.encoding) as f:
@@ -191,7 +198,7 @@ class ResultOutputManager:
             }
     
     def _save_metadata(self, integration_result: Dict, session_dirs: Dict, 
-                      session_id: str) -> Dict:
+                      session_id: str, result_dir: Optional[str] = None) -> Dict:
         """
         メタデータを保存
         
@@ -199,6 +206,7 @@ class ResultOutputManager:
             integration_result: 統合結果
             session_dirs: セッションディレクトリ情報
             session_id: セッションID
+            result_dir: 出力先ディレクトリ（省略時は result_base_dir）
             
         Returns:
             Dict: 保存結果
@@ -227,7 +235,7 @@ class ResultOutputManager:
             
             # メタデータファイル名生成
             filename = f"integration_metadata_{session_id}.json"
-            filepath = os.path.join(self.result_base_dir, filename)
+            filepath = os.path.join(result_dir or self.result_base_dir, filename)
             
             # JSONファイル保存
             with open(filepath, 'w', encoding=self.encoding) as f:
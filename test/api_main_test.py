@@ -0,0 +1,785 @@
+#!/usr/bin/env python3
+"""
+src/api/main.py の単体テスト
+（GCSやVertex AIへの通信は行わず、必要な箇所はモックに差し替える）
+"""
+
+import asyncio
+import base64
+import re
+import sys
+import tempfile
+import unicodedata
+from pathlib import Path
+from unittest import mock
+
+import orjson
+from google.api_core import exceptions as google_exceptions
+from vertexai.preview import caching
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import src.api.main as api_main
+
+
+# ================================
+# リクエスト毎の結果ディレクトリ
+# ================================
+
+def _run_process_single_pdf(result_root, uploaded, seen_dirs):
+    """GCS・パイプライン・DBをモックしてprocess_single_pdfを1回実行する"""
+
+    def fake_pipeline(pdf_path, result_dir=None):
+        seen_dirs.append(result_dir)
+        (Path(result_dir) / "contract_ocr.json").write_text("{}")
+        return {"success": True}
+
+    def fake_upload(local_path, bucket_name, destination):
+        # アップロード時点では結果ファイルがまだ存在している
+        uploaded.append((Path(local_path).exists(), destination))
+        return f"gs://{bucket_name}/{destination}"
+
+    with mock.patch.object(api_main, "RESULT_ROOT", Path(result_root)), \
+            mock.patch.object(api_main, "download_from_gcs"), \
+            mock.patch.object(api_main, "run_main_pipeline", side_effect=fake_pipeline), \
+            mock.patch.object(api_main, "calculate_total_page_count", return_value=0), \
+            mock.patch.object(api_main, "upload_file_to_gcs", side_effect=fake_upload):
+        return api_main.process_single_pdf("bucket", "ws/pj/contract.pdf", "ws", "pj")
+
+
+def test_process_single_pdf_uses_private_result_dir():
+    """結果はRESULT_ROOT配下のリクエスト専用ディレクトリに出力され、アップロード後に削除される"""
+    with tempfile.TemporaryDirectory() as result_root:
+        uploaded, seen_dirs = [], []
+        first = _run_process_single_pdf(result_root, uploaded, seen_dirs)
+        second = _run_process_single_pdf(result_root, uploaded, seen_dirs)
+
+        assert first["success"] is True and second["success"] is True
+        assert first["output_files"] == ["gs://bucket/ws/pj/ocr_results/contract_ocr.json"]
+        assert uploaded == [(True, "ws/pj/ocr_results/contract_ocr.json")] * 2
+        # 同じPDFでもリクエスト毎に別のディレクトリを使い、処理後は残さない
+        assert len(set(seen_dirs)) == 2
+        for result_dir in seen_dirs:
+            assert Path(result_dir).parent == Path(result_root)
+            assert not Path(result_dir).exists()
+
+
+def test_run_main_pipeline_session_id_keeps_basename_and_timestamp():
+    """セッションIDは従来の「ベース名_日時」に短いUUIDを付けたもので、処理後に中間ディレクトリを削除する"""
+    pipeline = mock.Mock()
+    session_ids = []
+
+    def fake_run(pdf_path, pipeline=None, session_id=None, result_dir=None):
+        session_ids.append(session_id)
+        return {"success": True, "session_id": session_id}
+
+    with mock.patch.object(api_main, "get_pipeline", return_value=pipeline), \
+            mock.patch.object(api_main, "pipeline_run", side_effect=fake_run):
+        api_main.run_main_pipeline("/tmp/ocr_ws_pj_x/契約書.pdf", result_dir="/tmp/result/ws_pj_abc")
+        api_main.run_main_pipeline("/tmp/ocr_ws_pj_y/契約書.pdf", result_dir="/tmp/result/ws_pj_def")
+
+    assert len(set(session_ids)) == 2
+    for session_id in session_ids:
+        assert re.fullmatch(r"契約書_\d{8}_\d{6}_[0-9a-f]{8}", session_id)
+    assert [c.args for c in pipeline.directory_manager.remove_session_directories.call_args_list] == \
+        [(session_id,) for session_id in session_ids]
+
+
+def test_process_test_pdf_returns_only_its_own_results():
+    """GET /ocr のテスト処理もリクエスト専用の結果ディレクトリを使い、過去の結果を返さず、処理後に削除する"""
+    with tempfile.TemporaryDirectory() as project_dir, tempfile.TemporaryDirectory() as result_root:
+        (Path(project_dir) / "pdf").mkdir()
+        (Path(project_dir) / "pdf" / "contract.pdf").write_bytes(b"%PDF-1.4")
+        # 共有ディレクトリに残った過去の結果は拾わない
+        (Path(result_root) / "integration_metadata_old.json").write_text('{"old": true}')
+        seen_dirs = []
+
+        def fake_pipeline(pdf_path, result_dir=None):
+            seen_dirs.append(result_dir)
+            (Path(result_dir) / f"integration_metadata_run{len(seen_dirs)}.json").write_text(f'{{"run": {len(seen_dirs)}}}')
+            return {"success": True}
+
+        with mock.patch.object(api_main, "PROJECT_ROOT", Path(project_dir)), \
+                mock.patch.object(api_main, "RESULT_ROOT", Path(result_root)), \
+                mock.patch.object(api_main, "run_main_pipeline", side_effect=fake_pipeline):
+            first = api_main.process_test_pdf("contract.pdf")
+            second = api_main.process_test_pdf("contract.pdf")
+
+        assert [f["filename"] for f in first["result_files"]] == ["integration_metadata_run1.json"]
+        assert first["contract_data"] == {"run": 1}
+        assert [f["filename"] for f in second["result_files"]] == ["integration_metadata_run2.json"]
+        assert second["contract_data"] == {"run": 2}
+        for result_dir in seen_dirs:
+            assert Path(result_dir).parent == Path(result_root)
+            assert not Path(result_dir).exists()
+
+
+# ================================
+# PubSub重複排除キャッシュ
+# ================================
+
+class FakeClock:
+    """time.monotonic の代わりに使う手動で進める時計"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _reset_seen_objects():
+    with api_main._seen_objects_lock:
+        api_main._seen_objects.clear()
+
+
+def test_mark_object_seen_rejects_duplicates_within_ttl():
+    """TTL内の再配信は重複として扱われる"""
+    _reset_seen_objects()
+    clock = FakeClock()
+    with mock.patch.object(api_main.time, "monotonic", clock):
+        assert api_main.mark_object_seen("bucket/a.pdf") is True
+        assert api_main.mark_object_seen("bucket/a.pdf") is False
+        clock.now += api_main._SEEN_OBJECTS_TTL - 1
+        assert api_main.mark_object_seen("bucket/a.pdf") is False
+
+
+def test_mark_object_seen_accepts_again_after_ttl():
+    """TTL切れのエントリは未受付に戻る"""
+    _reset_seen_objects()
+    clock = FakeClock()
+    with mock.patch.object(api_main.time, "monotonic", clock):
+        assert api_main.mark_object_seen("bucket/a.pdf") is True
+        clock.now += api_main._SEEN_OBJECTS_TTL
+        assert api_main.get_object_result("bucket/a.pdf") is None
+        assert api_main.mark_object_seen("bucket/a.pdf") is True
+
+
+def test_mark_object_seen_evicts_least_recently_used():
+    """上限を超えると最も古く参照されたエントリから追い出される"""
+    _reset_seen_objects()
+    with mock.patch.object(api_main, "_SEEN_OBJECTS_MAX", 2):
+        assert api_main.mark_object_seen("a") is True
+        assert api_main.mark_object_seen("b") is True
+        # 重複配信でaを参照し直すと、次の追加で追い出されるのはbになる
+        assert api_main.mark_object_seen("a") is False
+        assert api_main.mark_object_seen("c") is True
+        assert list(api_main._seen_objects) == ["a", "c"]
+        assert api_main.mark_object_seen("b") is True
+
+
+def test_cached_response_replay():
+    """処理完了時のレスポンスはTTL内の再配信で返せ、TTL切れで失効する"""
+    _reset_seen_objects()
+    clock = FakeClock()
+    with mock.patch.object(api_main.time, "monotonic", clock):
+        api_main.mark_object_seen("ok.pdf")
+        assert api_main.get_object_result("ok.pdf") is None
+
+        response = {"success": True, "output_files": ["gs://bucket/ok.json"]}
+        api_main.remember_object_result("ok.pdf", response)
+        # 重複配信は再処理されず、記録済みのレスポンスが返せる
+        assert api_main.mark_object_seen("ok.pdf") is False
+        assert api_main.get_object_result("ok.pdf") is response
+
+        clock.now += api_main._SEEN_OBJECTS_TTL
+        assert api_main.get_object_result("ok.pdf") is None
+
+
+def test_remember_object_result_ignores_unknown_objects():
+    """受付していない（追い出し済みの）オブジェクトの結果は記録しない"""
+    _reset_seen_objects()
+    api_main.remember_object_result("never-seen.pdf", {"success": True})
+    assert "never-seen.pdf" not in api_main._seen_objects
+    assert api_main.get_object_result("never-seen.pdf") is None
+
+
+# ================================
+# 構造化出力のデコード
+# ================================
+
+def _contract_json(**info):
+    return orjson.dumps({
+        "success": True,
+        "info": {"title": "業務委託契約書", "party": "甲:A社,乙:B社", **info},
+        "result": {"articles": [
+            {"title": "第1条（目的）", "article_number": "第1条", "content": "本契約は…"},
+            {"title": "第2条（期間）", "content": "1年間とする"},
+        ]},
+    }).decode()
+
+
+def test_decode_contract_response_returns_dict_and_article_count():
+    """構造化出力をdictに戻し、未設定のオプション項目はキーごと省く"""
+    data, article_count = api_main.decode_contract_response(_contract_json(start_date="2024-04-01"))
+
+    assert article_count == 2
+    assert data["info"] == {"title": "業務委託契約書", "party": "甲:A社,乙:B社", "start_date": "2024-04-01"}
+    assert data["result"]["articles"][1] == {"title": "第2条（期間）", "content": "1年間とする"}
+    assert "article_number" not in data["result"]["articles"][1]
+
+
+def test_decode_contract_response_rejects_malformed_output():
+    """壊れたJSON・スキーマ違反はエラーアップロード経路で扱う例外になる"""
+    broken = ['{"success": true, "info": ']
+    if api_main.msgspec is not None:
+        # 必須項目（info.party）の欠落や型違いもデコード時に検出する
+        broken.append('[]')
+        broken.append(orjson.dumps({"success": True, "info": {"title": "x"}, "result": {"articles": []}}).decode())
+        broken.append(orjson.dumps({"success": True, "info": {"title": "x", "party": "y"}, "result": {"articles": "x"}}).decode())
+    for text in broken:
+        try:
+            api_main.decode_contract_response(text)
+        except api_main._CONTRACT_DECODE_ERRORS:
+            continue
+        raise AssertionError(f"decode error not raised for {text!r}")
+
+
+# ================================
+# 構造化結果のプロセス内キャッシュ
+# ================================
+
+def _reset_contract_cache():
+    with api_main._structured_contract_lock:
+        api_main._structured_contract_cache.clear()
+
+
+def test_contract_cache_returns_independent_copies():
+    """キャッシュヒットは毎回新しいdictを返し、呼び出し側の変更はキャッシュに波及しない"""
+    _reset_contract_cache()
+    key = api_main._contract_cache_key("第1条 本契約は…", "contract")
+    assert api_main.get_cached_contract(key) is None
+
+    api_main.remember_contract(key, {"result": {"articles": [{"title": "第1条"}]}})
+    cached = api_main.get_cached_contract(key)
+    cached["result"]["articles"][0]["risks"] = ["変更"]
+
+    assert api_main.get_cached_contract(key) == {"result": {"articles": [{"title": "第1条"}]}}
+
+
+def test_contract_cache_key_includes_text_and_basename():
+    """同じテキストでもファイル名が違えば別のエントリになる"""
+    key = api_main._contract_cache_key("本文", "a")
+    assert key == api_main._contract_cache_key("本文", "a")
+    assert key != api_main._contract_cache_key("本文", "b")
+    assert key != api_main._contract_cache_key("本文2", "a")
+
+
+def test_contract_cache_evicts_least_recently_used():
+    """上限を超えると最も古く参照されたエントリから追い出され、上限0では保存しない"""
+    _reset_contract_cache()
+    keys = [api_main._contract_cache_key(text, "doc") for text in ("a", "b", "c")]
+    with mock.patch.object(api_main, "CONTRACT_CACHE_MAX", 2):
+        api_main.remember_contract(keys[0], {"n": 0})
+        api_main.remember_contract(keys[1], {"n": 1})
+        assert api_main.get_cached_contract(keys[0]) == {"n": 0}
+        api_main.remember_contract(keys[2], {"n": 2})
+        assert api_main.get_cached_contract(keys[1]) is None
+        assert api_main.get_cached_contract(keys[0]) == {"n": 0}
+
+    _reset_contract_cache()
+    with mock.patch.object(api_main, "CONTRACT_CACHE_MAX", 0):
+        api_main.remember_contract(keys[0], {"n": 0})
+        assert api_main.get_cached_contract(keys[0]) is None
+
+
+def test_structure_contract_skips_vertex_ai_on_cache_hit():
+    """キャッシュ済みのテキストはVertex AIを呼ばずに結果を返す"""
+    _reset_contract_cache()
+    api_main.remember_contract(api_main._contract_cache_key("本文", "doc"), {"success": True})
+    with mock.patch.object(api_main, "init_vertexai") as init_vertexai:
+        assert api_main._structure_contract("本文", "doc") == {"success": True}
+        init_vertexai.assert_not_called()
+
+
+# ================================
+# GCSファイル名の表記揺れ探索
+# ================================
+
+class FakeBlob:
+    def __init__(self, name: str, size: int = 10):
+        self.name = name
+        self.size = size
+
+
+class FakeBucket:
+    """get_blob/list_blobsの呼び出しを記録するバケット"""
+
+    def __init__(self, names):
+        self.blobs = {name: FakeBlob(name) for name in names}
+        self.get_blob_calls = []
+        self.list_blobs_calls = []
+
+    def get_blob(self, name):
+        self.get_blob_calls.append(name)
+        return self.blobs.get(name)
+
+    def list_blobs(self, prefix, **kwargs):
+        self.list_blobs_calls.append(prefix)
+        return [blob for name, blob in self.blobs.items() if name.startswith(prefix)]
+
+
+def _download_with(bucket, uri):
+    downloaded = []
+    with mock.patch.object(api_main, "get_bucket", return_value=bucket), \
+            mock.patch.object(api_main, "_download_blob_to_file",
+                              side_effect=lambda blob, path: downloaded.append(blob.name)):
+        api_main.download_from_gcs(uri, "/tmp/unused.pdf")
+    return downloaded
+
+
+def test_download_from_gcs_tries_exact_then_nfc_then_nfd():
+    """直接参照は 指定どおり → NFC → NFD の順に試し、見つかれば一覧は使わない"""
+    nfc_name = unicodedata.normalize("NFC", "ws/pj/ガイドライン.pdf")
+    nfd_name = unicodedata.normalize("NFD", nfc_name)
+
+    # NFDで保存されたblobをNFCで指定した場合
+    bucket = FakeBucket([nfd_name])
+    assert _download_with(bucket, f"gs://bucket/{nfc_name}") == [nfd_name]
+    assert bucket.get_blob_calls == [nfc_name, nfd_name]
+    assert bucket.list_blobs_calls == []
+
+    # NFCで保存されたblobをNFDで指定した場合（NFD候補は指定どおりの名前と重複するため1回だけ）
+    bucket = FakeBucket([nfc_name])
+    assert _download_with(bucket, f"gs://bucket/{nfd_name}") == [nfc_name]
+    assert bucket.get_blob_calls == [nfd_name, nfc_name]
+    assert bucket.list_blobs_calls == []
+
+
+def test_download_from_gcs_ascii_name_single_lookup():
+    """ASCIIのみの名前は正規化候補が重複するため直接参照は1回だけ"""
+    bucket = FakeBucket(["ws/pj/contract.pdf"])
+    assert _download_with(bucket, "gs://bucket/ws/pj/contract.pdf") == ["ws/pj/contract.pdf"]
+    assert bucket.get_blob_calls == ["ws/pj/contract.pdf"]
+
+
+def test_download_from_gcs_lists_directory_when_direct_lookup_misses():
+    """ディレクトリとファイル名で表記が混在する場合は、同じディレクトリを一覧して正規化後の名前で照合する"""
+    directory = unicodedata.normalize("NFC", "ws/プロジェクト/")
+    stored = directory + unicodedata.normalize("NFD", "ガイドライン.pdf")
+    bucket = FakeBucket([stored])
+
+    assert _download_with(bucket, f"gs://bucket/{directory}ガイドライン.pdf") == [stored]
+    assert bucket.list_blobs_calls == [directory]
+
+
+def test_download_from_gcs_raises_when_missing():
+    """どの候補にも一致しなければFileNotFoundError"""
+    bucket = FakeBucket(["ws/pj/other.pdf"])
+    try:
+        _download_with(bucket, "gs://bucket/ws/pj/contract.pdf")
+    except FileNotFoundError:
+        return
+    raise AssertionError("FileNotFoundError not raised")
+
+
+# ================================
+# OCRテキスト整形
+# ================================
+
+def test_prepare_ocr_text_strips_trailing_spaces_and_blank_lines():
+    """行末空白と3行以上の空行を詰め、前後の空行を落とす"""
+    text = "\n第1条（目的）  \n本契約はこれを定める。 \t\n\n\n\n第2条\n\n"
+    assert api_main._prepare_ocr_text(text) == "第1条（目的）\n本契約はこれを定める。\n\n第2条"
+
+
+def test_prepare_ocr_text_keeps_spacing_within_lines():
+    """行内の連続空白・タブやインデントは表の桁揃え等のためそのまま残す"""
+    text = "  第1条 \t（目的）\n品名    数量\t\t単価"
+    assert api_main._prepare_ocr_text(text) == text
+
+
+def test_prepare_ocr_text_keeps_characters_and_paragraphs():
+    """文字そのもの（全角スペース・全角英数字・丸数字）と2行までの空行は変えない"""
+    text = "①　ＡＢＣ株式会社\n\n②　甲"
+    assert api_main._prepare_ocr_text(text) == text
+    assert api_main._prepare_ocr_text("") == ""
+
+
+def test_download_from_gcs_listing_prefers_exact_over_partial():
+    """一覧での照合は部分一致より完全一致（正規化後）を優先し、完全一致が無ければ部分一致を使う"""
+    bucket = FakeBucket(["ws/pj/signed_contract.pdf", "ws/pj/contract.pdf"])
+    # 直接参照は失敗させ、一覧での照合に回す
+    bucket.get_blob = lambda name: None
+    assert _download_with(bucket, "gs://bucket/ws/pj/contract.pdf") == ["ws/pj/contract.pdf"]
+    assert bucket.list_blobs_calls == ["ws/pj/"]
+
+    bucket = FakeBucket(["ws/pj/signed_contract.pdf"])
+    bucket.get_blob = lambda name: None
+    assert _download_with(bucket, "gs://bucket/ws/pj/contract.pdf") == ["ws/pj/signed_contract.pdf"]
+
+
+# ================================
+# Gemini呼び出しのリトライ
+# ================================
+
+class FlakyModel:
+    """指定した例外を順に送出してから応答を返すモデル"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "response"
+
+
+def _run_with_retry(model, attempts=3):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    with mock.patch.object(api_main, "GEMINI_RETRY_ATTEMPTS", attempts), \
+            mock.patch.object(api_main.asyncio, "sleep", fake_sleep), \
+            mock.patch.object(api_main.random, "uniform", return_value=0.0):
+        try:
+            return asyncio.run(api_main.generate_content_with_retry(model, "prompt", None)), delays
+        except Exception as e:
+            return e, delays
+
+
+def test_generate_content_with_retry_backs_off_on_transient_errors():
+    """一時的なエラーは指数バックオフでリトライし、成功した応答を返す"""
+    model = FlakyModel([google_exceptions.TooManyRequests("429"), google_exceptions.ServiceUnavailable("503")])
+    result, delays = _run_with_retry(model)
+    assert result == "response"
+    assert model.calls == 3
+    assert delays == [1.0, 2.0]
+
+
+def test_generate_content_with_retry_caps_delay_and_reraises_last_error():
+    """待ち時間は上限で頭打ちになり、最後の試行の失敗はそのまま送出する"""
+    errors = [google_exceptions.DeadlineExceeded("timeout") for _ in range(7)]
+    model = FlakyModel(errors)
+    result, delays = _run_with_retry(model, attempts=7)
+    assert isinstance(result, google_exceptions.DeadlineExceeded)
+    assert model.calls == 7
+    assert delays == [1.0, 2.0, 4.0, 8.0, 16.0, 16.0]
+
+
+def test_generate_content_with_retry_does_not_retry_permanent_errors():
+    """リクエスト不正などの恒久的なエラーはリトライしない"""
+    model = FlakyModel([google_exceptions.InvalidArgument("bad request")])
+    result, delays = _run_with_retry(model)
+    assert isinstance(result, google_exceptions.InvalidArgument)
+    assert model.calls == 1
+    assert delays == []
+
+
+def test_truncate_ocr_text_boundaries():
+    """上限ちょうどは切り詰めず、1文字でも超えたら先頭75%・末尾25%を残す"""
+    with mock.patch.object(api_main, "CONTRACT_TEXT_MAX_CHARS", 100):
+        at_limit = "x" * 100
+        text, truncated = api_main._truncate_ocr_text(at_limit, "doc")
+        assert text is at_limit and truncated is False
+
+        over_limit = "h" * 75 + "m" + "t" * 25
+        text, truncated = api_main._truncate_ocr_text(over_limit, "doc")
+        assert text == "h" * 75 + "\n...[truncated]...\n" + "t" * 25
+        assert truncated is True
+
+
+def test_truncate_ocr_text_disabled_with_zero():
+    """上限0は無制限"""
+    with mock.patch.object(api_main, "CONTRACT_TEXT_MAX_CHARS", 0):
+        text = "x" * 10000
+        assert api_main._truncate_ocr_text(text, "doc") == (text, False)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def _structure_with_fake_gemini(file_content):
+    """Vertex AIをモックして_structure_contractを実行し、(結果, Gemini呼び出し回数) を返す"""
+    calls = []
+
+    async def fake_generate(model, prompt, generation_config):
+        calls.append(prompt)
+        return FakeResponse(_contract_json())
+
+    with mock.patch.object(api_main, "init_vertexai", return_value=True), \
+            mock.patch.object(api_main, "build_contract_request", side_effect=lambda basename, text: (None, [text])), \
+            mock.patch.object(api_main, "get_contract_generation_config"), \
+            mock.patch.object(api_main, "generate_content_with_retry", side_effect=fake_generate):
+        return api_main._structure_contract(file_content, "doc"), len(calls)
+
+
+def test_structure_contract_flags_and_does_not_cache_truncated_results():
+    """上限で切り詰めたテキストの結果は truncated を付け、キャッシュせず毎回構造化し直す"""
+    _reset_contract_cache()
+    with mock.patch.object(api_main, "CONTRACT_TEXT_MAX_CHARS", 100):
+        first, first_calls = _structure_with_fake_gemini("条" * 101)
+        second, second_calls = _structure_with_fake_gemini("条" * 101)
+        assert first["truncated"] is True and second["truncated"] is True
+        assert (first_calls, second_calls) == (1, 1)
+
+        complete, _ = _structure_with_fake_gemini("条" * 100)
+        cached, cached_calls = _structure_with_fake_gemini("条" * 100)
+        assert "truncated" not in complete
+        assert cached == complete and cached_calls == 0
+
+
+def test_get_object_status_transitions():
+    """未受付→処理中→完了/失敗の状態と、TTL切れでunknownに戻ることを確認する"""
+    _reset_seen_objects()
+    clock = FakeClock()
+    with mock.patch.object(api_main.time, "monotonic", clock):
+        assert api_main.get_object_status("ok.pdf") == ("unknown", None)
+
+        api_main.mark_object_seen("ok.pdf")
+        assert api_main.get_object_status("ok.pdf") == ("processing", None)
+
+        response = {"success": True, "output_files": ["gs://bucket/ok.json"]}
+        api_main.remember_object_result("ok.pdf", response)
+        assert api_main.get_object_status("ok.pdf") == ("completed", response)
+
+        api_main.mark_object_seen("ng.pdf")
+        failure = {"success": False, "error": "boom"}
+        api_main.remember_object_result("ng.pdf", failure)
+        assert api_main.get_object_status("ng.pdf") == ("failed", failure)
+
+        clock.now += api_main._SEEN_OBJECTS_TTL
+        assert api_main.get_object_status("ok.pdf") == ("unknown", None)
+
+
+def test_jobs_endpoint_reports_status():
+    """GET /jobs/<object_id> は状態とレスポンスを返し、未受付は404"""
+    _reset_seen_objects()
+    api_main.mark_object_seen("bucket/ws/pj/a.pdf/1")
+    client = api_main.app.test_client()
+
+    response = client.get("/jobs/bucket/ws/pj/a.pdf/1")
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "processing"
+
+    assert client.get("/jobs/bucket/ws/pj/missing.pdf/1").status_code == 404
+
+
+def _push(client, object_id):
+    """Storage通知のPubSubメッセージを /pubsub/push に送る"""
+    storage_object = {"id": object_id, "name": "ws/pj/a.pdf", "bucket": "bucket"}
+    data = base64.b64encode(orjson.dumps(storage_object)).decode("ascii")
+    return client.post("/pubsub/push", json={"message": {"data": data, "attributes": {}}})
+
+
+class FakeAsyncResult:
+    def __init__(self, state, result=None):
+        self.state = state
+        self.result = result
+
+
+def test_pubsub_sync_failure_is_recorded():
+    """同期処理の失敗も結果を記録し、/jobs が処理中のまま残らず再配信には同じ失敗を返す"""
+    _reset_seen_objects()
+    client = api_main.app.test_client()
+    failure = {"success": False, "error": "boom"}
+    with mock.patch.object(api_main, "celery_app", None), \
+            mock.patch.object(api_main, "PUBSUB_ASYNC_ACK", False), \
+            mock.patch.object(api_main, "process_single_pdf", return_value=failure) as process:
+        first = _push(client, "bucket/ws/pj/a.pdf/1")
+        second = _push(client, "bucket/ws/pj/a.pdf/1")
+
+    assert process.call_count == 1
+    assert first.get_json()["error"] == "boom"
+    assert second.get_json() == first.get_json()
+    jobs = client.get("/jobs/bucket/ws/pj/a.pdf/1").get_json()
+    assert jobs["status"] == "failed" and jobs["result"]["error"] == "boom"
+
+
+def test_pubsub_celery_dispatch_reports_task_state():
+    """Celery投入後の /jobs はタスクの状態を返し、再配信には投入時のレスポンスを返す"""
+    _reset_seen_objects()
+    client = api_main.app.test_client()
+    fake_celery = mock.Mock()
+    task = mock.Mock()
+    task.delay.return_value = mock.Mock(id="task-1")
+    with mock.patch.object(api_main, "celery_app", fake_celery), \
+            mock.patch.object(api_main, "process_pdf_task", task, create=True):
+        first = _push(client, "bucket/ws/pj/a.pdf/1")
+        second = _push(client, "bucket/ws/pj/a.pdf/1")
+        assert task.delay.call_count == 1
+        assert first.get_json()["status"] == "queued"
+        assert second.get_json() == first.get_json()
+
+        fake_celery.AsyncResult.return_value = FakeAsyncResult("STARTED")
+        assert client.get("/jobs/bucket/ws/pj/a.pdf/1").get_json()["status"] == "processing"
+
+        fake_celery.AsyncResult.return_value = FakeAsyncResult("SUCCESS", {"success": True, "output_files": ["gs://x.json"]})
+        jobs = client.get("/jobs/bucket/ws/pj/a.pdf/1").get_json()
+        assert jobs["status"] == "completed" and jobs["result"]["output_files"] == ["gs://x.json"]
+
+        fake_celery.AsyncResult.return_value = FakeAsyncResult("FAILURE", RuntimeError("boom"))
+        jobs = client.get("/jobs/bucket/ws/pj/a.pdf/1").get_json()
+        assert jobs["status"] == "failed" and jobs["result"]["error"] == "boom"
+    fake_celery.AsyncResult.assert_called_with("task-1")
+
+
+def test_pubsub_celery_dispatch_failure_allows_redelivery():
+    """Celeryへの投入に失敗したら受付記録を消してNACKし、再配信で再投入できる"""
+    _reset_seen_objects()
+    client = api_main.app.test_client()
+    task = mock.Mock()
+    task.delay.side_effect = [ConnectionError("redis down"), mock.Mock(id="task-2")]
+    with mock.patch.object(api_main, "celery_app", mock.Mock()), \
+            mock.patch.object(api_main, "process_pdf_task", task, create=True):
+        assert _push(client, "bucket/ws/pj/a.pdf/1").status_code == 503
+        retried = _push(client, "bucket/ws/pj/a.pdf/1")
+
+    assert retried.status_code == 200
+    assert retried.get_json()["task_id"] == "task-2"
+
+
+# ================================
+# GCS URI解析
+# ================================
+
+def test_parse_gcs_uri():
+    """gs://バケット/パス をバケット名とオブジェクトパスに分解する"""
+    assert api_main.parse_gcs_uri("gs://bucket/ws/pj/a.pdf") == ("bucket", "ws/pj/a.pdf")
+    assert api_main.parse_gcs_uri("gs://bucket") == ("bucket", "")
+    assert api_main.parse_gcs_uri("gs://bucket/") == ("bucket", "")
+
+
+def test_parse_gcs_uri_rejects_non_gcs_uris():
+    """gs:// で始まらないURIはValueError"""
+    for uri in ("s3://bucket/a.pdf", "bucket/a.pdf", "", "GS://bucket/a.pdf"):
+        try:
+            api_main.parse_gcs_uri(uri)
+        except ValueError:
+            continue
+        raise AssertionError(f"ValueError not raised for {uri!r}")
+
+
+def test_download_from_gcs_requires_object_path():
+    """オブジェクトパスの無いURIはGCSにアクセスせずValueError"""
+    with mock.patch.object(api_main, "get_bucket") as get_bucket:
+        try:
+            api_main.download_from_gcs("gs://bucket", "/tmp/unused.pdf")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("ValueError not raised")
+        get_bucket.assert_not_called()
+
+
+def test_nfc_skips_normalization_for_ascii():
+    """ASCIIのみの名前はそのまま返し、それ以外はNFCに正規化する"""
+    ascii_name = "ws/pj/contract.pdf"
+    assert api_main._nfc(ascii_name) is ascii_name
+
+    nfd_name = unicodedata.normalize("NFD", "ガイドライン.pdf")
+    assert api_main._nfc(nfd_name) == unicodedata.normalize("NFC", nfd_name)
+
+
+def test_download_from_gcs_propagates_errors_for_existing_blobs():
+    """メタデータ取得やダウンロードの失敗は一覧での探索に回さず、そのまま送出する"""
+    bucket = FakeBucket(["ws/pj/contract.pdf"])
+    bucket.get_blob = mock.Mock(side_effect=google_exceptions.ServiceUnavailable("503"))
+    try:
+        _download_with(bucket, "gs://bucket/ws/pj/contract.pdf")
+    except google_exceptions.ServiceUnavailable:
+        pass
+    else:
+        raise AssertionError("ServiceUnavailable not raised")
+    assert bucket.list_blobs_calls == []
+
+    bucket = FakeBucket(["ws/pj/contract.pdf"])
+    with mock.patch.object(api_main, "get_bucket", return_value=bucket), \
+            mock.patch.object(api_main, "_download_blob_to_file", side_effect=OSError("disk full")):
+        try:
+            api_main.download_from_gcs("gs://bucket/ws/pj/contract.pdf", "/tmp/unused.pdf")
+        except OSError:
+            pass
+        else:
+            raise AssertionError("OSError not raised")
+    assert bucket.list_blobs_calls == []
+
+
+# ================================
+# 構造化リクエストの組み立て
+# ================================
+
+def _requested_model_name(file_content):
+    with mock.patch.object(api_main, "get_contract_cached_content", return_value=None), \
+            mock.patch.object(api_main, "get_gemini_model", side_effect=lambda name: name):
+        model, prompt = api_main.build_contract_request("contract", file_content)
+    assert prompt[1] is file_content
+    return model
+
+
+def test_build_contract_request_uses_main_model_by_default():
+    """軽量モデルへの振り分けは既定で無効で、短い契約書も通常モデルで構造化する"""
+    assert api_main.GEMINI_LITE_MODEL_NAME == ""
+    assert _requested_model_name("短い契約書") == api_main.GEMINI_MODEL_NAME
+
+
+def test_build_contract_request_routes_short_texts_to_lite_model_when_enabled():
+    """GEMINI_LITE_MODEL_NAME を設定した場合のみ、上限以下の短いテキストを軽量モデルに送る"""
+    with mock.patch.object(api_main, "GEMINI_LITE_MODEL_NAME", "gemini-2.5-flash-lite"), \
+            mock.patch.object(api_main, "GEMINI_LITE_MAX_CHARS", 10):
+        assert _requested_model_name("x" * 10) == "gemini-2.5-flash-lite"
+        assert _requested_model_name("x" * 11) == api_main.GEMINI_MODEL_NAME
+
+
+def _reset_context_cache():
+    api_main._contract_cache = None
+    api_main._contract_cache_expires_at = 0.0
+    api_main._contract_cache_disabled = False
+
+
+def test_context_cache_disabled_after_rejection():
+    """最小サイズ未満等で作成を拒否されたら、以降はプロセス内で作成を試みない"""
+    _reset_context_cache()
+    rejected = google_exceptions.InvalidArgument("cached content is too small")
+    with mock.patch.object(api_main, "GEMINI_CONTEXT_CACHE", True), \
+            mock.patch.object(caching.CachedContent, "create", side_effect=rejected) as create:
+        assert api_main.get_contract_cached_content() is None
+        assert api_main.get_contract_cached_content() is None
+    assert create.call_count == 1
+    _reset_context_cache()
+
+
+def test_context_cache_retries_after_transient_failure():
+    """一時的な障害で作成に失敗した場合は、再作成の間隔を空けて作り直す"""
+    _reset_context_cache()
+    clock = FakeClock()
+    created = mock.Mock(name="cached-content")
+    with mock.patch.object(api_main, "GEMINI_CONTEXT_CACHE", True), \
+            mock.patch.object(api_main.time, "monotonic", clock), \
+            mock.patch.object(caching.CachedContent, "create",
+                              side_effect=[google_exceptions.ServiceUnavailable("down"), created]) as create:
+        assert api_main.get_contract_cached_content() is None
+        assert api_main.get_contract_cached_content() is None
+        clock.now += api_main._CONTEXT_CACHE_REFRESH_MARGIN
+        assert api_main.get_contract_cached_content() is created
+    assert create.call_count == 2
+    _reset_context_cache()
+
+
+def main():
+    """単体テストの実行（pytestが無い環境でも python test/api_main_test.py で実行可能）"""
+    tests = [(name, func) for name, func in globals().items() if name.startswith("test_") and callable(func)]
+
+    failed = 0
+    for test_name, test_func in tests:
+        try:
+            test_func()
+            print(f"✅ {test_name}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test_name}: {e!r}")
+
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
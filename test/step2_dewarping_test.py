@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Step2 歪み補正エンジンの単体テスト
+YOLOモデルは呼び出しを記録するフェイクに差し替え、ページ単位のバッチ推論を検証する
+"""
+
+import sys
+import importlib.util
+import tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+spec = importlib.util.spec_from_file_location(
+    "dewarping_engine",
+    project_root / "src" / "modules" / "step2" / "03_dewarping_engine.py"
+)
+dewarping_engine = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(dewarping_engine)
+
+
+class FakeTensor:
+    def __init__(self, values):
+        self.values = np.array(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class FakeBox:
+    def __init__(self, xyxy):
+        self.xyxy = [FakeTensor(xyxy)]
+
+
+class FakeResult:
+    def __init__(self, xyxy=None):
+        self.boxes = [FakeBox(xyxy)] if xyxy is not None else None
+
+
+class FakeYOLO:
+    """predictの呼び出し毎の枚数を記録し、指定した画像（インデックス）だけ文書を検出する"""
+
+    def __init__(self, detect=()):
+        self.batch_sizes = []
+        self.detect = set(detect)
+        self.seen = 0
+
+    def predict(self, images, conf, verbose):
+        self.batch_sizes.append(len(images))
+        results = []
+        for image in images:
+            h, w = image.shape[:2]
+            results.append(FakeResult([0, 0, w - 1, h - 1] if self.seen in self.detect else None))
+            self.seen += 1
+        return results
+
+
+def _make_engine(yolo, batch_size):
+    engine = dewarping_engine.DewarpingEngine({"dewarping": {"yolo_batch_size": batch_size}})
+    engine.yolo_model = yolo
+    return engine
+
+
+def _page(page_number, image_path, needs_dewarping=True):
+    return {
+        "page_number": page_number,
+        "processed_image": image_path,
+        "llm_result": {"success": True, "judgment": {"needs_dewarping": needs_dewarping}},
+    }
+
+
+def _write_pages(directory, count):
+    paths = []
+    for i in range(count):
+        path = str(Path(directory) / f"page_{i + 1}.jpg")
+        cv2.imwrite(path, np.full((40, 30, 3), 255, dtype=np.uint8))
+        paths.append(path)
+    return paths
+
+
+def test_detect_document_corners_batch_maps_results_per_image():
+    """1回のpredictで全画像を推論し、検出結果を画像の順に四隅座標へ変換する"""
+    yolo = FakeYOLO(detect={1})
+    engine = _make_engine(yolo, batch_size=8)
+    images = [np.zeros((40, 30, 3), dtype=np.uint8) for _ in range(3)]
+
+    corners = engine._detect_document_corners_batch(images)
+
+    assert yolo.batch_sizes == [3]
+    assert corners[0] is None and corners[2] is None
+    assert corners[1].tolist() == [[0, 0], [29, 0], [29, 39], [0, 39]]
+    assert engine._detect_document_corners_batch([]) == []
+
+
+def test_batch_process_images_runs_predict_per_chunk():
+    """補正対象ページを yolo_batch_size 件ずつまとめて推論する"""
+    yolo = FakeYOLO()
+    engine = _make_engine(yolo, batch_size=2)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _write_pages(temp_dir, 5)
+        pages = [_page(i + 1, path) for i, path in enumerate(paths)]
+        output_dir = str(Path(temp_dir) / "out")
+
+        result = engine.batch_process_images(pages, output_dir)
+
+        assert yolo.batch_sizes == [2, 2, 1]
+        assert result["success"] is True
+        assert result["total_processed"] == 5
+        assert result["successful_dewarping"] == 5
+        # 文書未検出のページは元画像がそのまま出力される
+        for page in pages:
+            assert page["dewarping_applied"] is True
+            assert Path(page["dewarped_image"]).exists()
+
+
+def test_batch_process_images_skips_unneeded_and_missing_pages():
+    """補正不要のページは推論せず、読み込めない画像はバッチから外してエラーを返す"""
+    yolo = FakeYOLO()
+    engine = _make_engine(yolo, batch_size=8)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _write_pages(temp_dir, 2)
+        pages = [
+            _page(1, paths[0]),
+            _page(2, paths[1], needs_dewarping=False),
+            _page(3, str(Path(temp_dir) / "missing.jpg")),
+        ]
+
+        result = engine.batch_process_images(pages, str(Path(temp_dir) / "out"))
+
+        assert yolo.batch_sizes == [1]
+        assert result["total_processed"] == 2
+        assert result["successful_dewarping"] == 1
+        assert pages[0]["dewarping_applied"] is True
+        assert pages[1]["dewarping_applied"] is False
+        assert "dewarping_result" not in pages[1]
+        assert pages[2]["dewarping_applied"] is False
+        assert pages[2]["dewarping_result"]["success"] is False
+
+
+def main():
+    """単体テストの実行（pytestが無い環境でも python test/step2_dewarping_test.py で実行可能）"""
+    tests = [(name, func) for name, func in globals().items() if name.startswith("test_") and callable(func)]
+
+    failed = 0
+    for test_name, test_func in tests:
+        try:
+            test_func()
+            print(f"✅ {test_name}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test_name}: {e!r}")
+
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())